@@ -1,63 +1,496 @@
 #!/usr/bin/env python3
 import os
+import re
+import json
 import time
-import tempfile
-import pyperclip
-from openai import OpenAI
+import hashlib
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from pydub import AudioSegment
-from pydub.playback import play
-from pynput import keyboard
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize OpenAI client with API key from .env
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# OpenAI (through the shared openai_gateway client), pydub, pynput and pyperclip
+# are imported where they are first needed so the CLI starts quickly
+
+TTS_MODEL = "tts-1"  # or "tts-1-hd" for higher quality
+TTS_VOICE = "sage"  # Options: alloy, echo, fable, onyx, nova, shimmer
+
+# The "pcm" response format is raw 24kHz 16-bit signed little-endian mono
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+STREAM_CHUNK_SIZE = 4096
+# Without pyaudio, pydub plays this much audio per call; cancel is checked in between
+FALLBACK_SLICE_SECONDS = 1.0
+
+# The speech endpoint accepts at most 4096 characters per request. Chunks are
+# kept well below that so synthesis runs in parallel, and the first chunk is
+# shorter still so playback starts quickly.
+CHUNK_MAX_CHARS = 1000
+FIRST_CHUNK_MAX_CHARS = 250
+SYNTHESIS_WORKERS = 3
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', 'tts_cache')
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_MB', '500')) * 1024 * 1024
+# Temp files older than this were left behind by a crashed put() and are removed
+TTS_CACHE_STALE_TEMP_SECONDS = 3600
+
+class TTSCache:
+    """On-disk audio cache keyed by a hash of the text and synthesis settings.
+
+    Entries are evicted least recently used first once the cache grows past
+    max_bytes; a file's mtime records when it was last played.
+    """
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.evict()
+
+    def key(self, text, model=TTS_MODEL, voice=TTS_VOICE, response_format="pcm"):
+        """Content address for a piece of audio"""
+        payload = json.dumps([text, model, voice, response_format])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, text):
+        """Return cached PCM for text, or None on a miss"""
+        path = self.path(self.key(text))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, text, data):
+        """Store PCM for text, then evict old entries if over budget"""
+        path = self.path(self.key(text))
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        # Rename into place so readers never see a partially written file
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes, and stale temp files"""
+        with self.lock:
+            entries = []
+            stale_before = time.time() - TTS_CACHE_STALE_TEMP_SECONDS
+            for entry in os.scandir(self.directory):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith('.pcm'):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                elif entry.name.endswith('.tmp') and stat.st_mtime < stale_before:
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def prewarm(self, phrases, workers=SYNTHESIS_WORKERS):
+        """Synthesize any phrases (chunked as speak_text would) that are not cached yet"""
+        chunks = [chunk for phrase in phrases for chunk in split_text(phrase)]
+        missing = list(dict.fromkeys(chunk for chunk in chunks if self.get(chunk) is None))
+
+        def fill(chunk):
+            self.put(chunk, synthesize_pcm(chunk))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fill, missing))
+        return len(missing)
+
+def open_audio_output():
+    """Open a PyAudio output stream for raw PCM, returning (audio, stream)"""
+    audio = pyaudio.PyAudio()
+    stream = audio.open(
+        format=audio.get_format_from_width(PCM_SAMPLE_WIDTH),
+        channels=PCM_CHANNELS,
+        rate=PCM_SAMPLE_RATE,
+        output=True
+    )
+    return audio, stream
+
+def split_text(text, max_chars=CHUNK_MAX_CHARS, first_chunk_chars=FIRST_CHUNK_MAX_CHARS):
+    """Split text into sentence-aligned chunks that fit the TTS input limit"""
+    sentences = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = ' '.join(paragraph.split())
+        if paragraph:
+            sentences.extend(SENTENCE_END.split(paragraph))
+
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        limit = first_chunk_chars if not chunks else max_chars
+        candidate = f"{current} {sentence}" if current else sentence
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+            limit = max_chars
+        # A single sentence over the limit is broken at word boundaries
+        current = ""
+        for word in sentence.split(' '):
+            while len(word) > limit:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(word[:limit])
+                word = word[limit:]
+                limit = max_chars
+            candidate = f"{current} {word}" if current else word
+            if len(candidate) <= limit:
+                current = candidate
+            else:
+                chunks.append(current)
+                current = word
+                limit = max_chars
+    if current:
+        chunks.append(current)
+    return chunks
+
+def synthesize_pcm(text):
+    """Synthesize one chunk of text to raw PCM bytes"""
+    from openai_gateway import get_gateway
+    response = get_gateway().call(
+        "audio.speech.create",
+        model=TTS_MODEL,
+        voice=TTS_VOICE,
+        input=text,
+        response_format="pcm"
+    )
+    return response.content
+
+audio_cache = None
+use_audio_cache = True
+audio_cache_lock = threading.Lock()
+
+def get_audio_cache():
+    """The shared TTSCache, created (with its directory) on first use; None with caching off"""
+    global audio_cache
+    if not use_audio_cache:
+        return None
+    with audio_cache_lock:
+        if audio_cache is None:
+            audio_cache = TTSCache()
+        return audio_cache
+
+def get_pcm(text):
+    """Return PCM for one chunk of text, from the cache when possible"""
+    cache = get_audio_cache()
+    if cache is not None:
+        data = cache.get(text)
+        if data is not None:
+            return data
+    data = synthesize_pcm(text)
+    if cache is not None:
+        cache.put(text, data)
+    return data
+
+def stream_pcm(text):
+    """Yield raw PCM bytes for text as they arrive from the API (or all at once if cached)"""
+    cache = get_audio_cache()
+    if cache is not None:
+        data = cache.get(text)
+        if data is not None:
+            yield data
+            return
+
+    from openai_gateway import get_gateway
+    received = []
+    with get_gateway().stream(
+        "audio.speech.with_streaming_response.create",
+        model=TTS_MODEL,
+        voice=TTS_VOICE,
+        input=text,
+        response_format="pcm"
+    ) as response:
+        for chunk in response.iter_bytes(chunk_size=STREAM_CHUNK_SIZE):
+            received.append(chunk)
+            yield chunk
+
+    # Only cache audio that was received in full
+    if cache is not None:
+        cache.put(text, b"".join(received))
+
+def write_pcm(stream, chunks, cancel=None):
+    """Write PCM chunks to an output stream, returning when the first samples went out"""
+    first_write = None
+    # Writes must be whole 16-bit samples, so carry odd trailing bytes to the next chunk
+    remainder = b""
+    for chunk in chunks:
+        data = remainder + chunk
+        usable = len(data) - len(data) % PCM_SAMPLE_WIDTH
+        remainder = data[usable:]
+        # Write in small slices so a cancel request takes effect within a fraction of a second
+        for offset in range(0, usable, STREAM_CHUNK_SIZE):
+            if cancel is not None and cancel.is_set():
+                return first_write
+            if first_write is None:
+                first_write = time.perf_counter()
+            stream.write(data[offset:min(offset + STREAM_CHUNK_SIZE, usable)])
+    return first_write
+
+def play_pcm(pcm, cancel=None):
+    """Play PCM through pydub in short slices so a cancel request stops it between slices"""
+    from pydub import AudioSegment
+    from pydub.playback import play
+    slice_bytes = int(PCM_SAMPLE_RATE * FALLBACK_SLICE_SECONDS) * PCM_SAMPLE_WIDTH * PCM_CHANNELS
+    first_play = None
+    for offset in range(0, len(pcm), slice_bytes):
+        if cancel is not None and cancel.is_set():
+            break
+        if first_play is None:
+            first_play = time.perf_counter()
+        play(AudioSegment(
+            data=pcm[offset:offset + slice_bytes],
+            sample_width=PCM_SAMPLE_WIDTH,
+            frame_rate=PCM_SAMPLE_RATE,
+            channels=PCM_CHANNELS
+        ))
+    return first_play
+
+def speak_text(text, workers=SYNTHESIS_WORKERS, cancel=None, on_first_audio=None):
+    """Speak text chunk by chunk, synthesizing upcoming chunks while earlier ones play.
+
+    Playback stops early once the optional cancel event is set. on_first_audio,
+    if given, is called with the perf_counter time the first samples were played.
+    """
+    chunks = split_text(text)
+    if not chunks:
+        return False
+
+    print(f"Speaking {len(chunks)} chunk(s): {text[:50]}..." if len(text) > 50 else f"Speaking: {text}")
+    audio, stream = None, None
+    executor = ThreadPoolExecutor(max_workers=workers)
+    first_audio = None
+
+    def mark_first_audio(timestamp):
+        nonlocal first_audio
+        if first_audio is None and timestamp is not None:
+            first_audio = timestamp
+            print(f"Time to first audio: {(first_audio - start_time) * 1000:.0f} ms")
+            if on_first_audio:
+                on_first_audio(first_audio)
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
 
-def text_to_speech(text):
-    """Convert text to speech using OpenAI API and play it"""
     try:
-        # Create a temporary file for the audio
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_filename = temp_file.name
-        temp_file.close()
-        
-        print(f"Converting to speech: {text[:50]}..." if len(text) > 50 else f"Converting to speech: {text}")
-        
-        # Generate speech using OpenAI API
-        response = client.audio.speech.create(
-            model="tts-1",  # or "tts-1-hd" for higher quality
-            voice="sage",  # Options: alloy, echo, fable, onyx, nova, shimmer
-            input=text
-        )
-        
-        # Save the audio to the temporary file using the recommended streaming method
-        with open(temp_filename, 'wb') as f:
-            for chunk in response.iter_bytes():
-                f.write(chunk)
-        
-        # Play the audio using pydub
-        audio = AudioSegment.from_mp3(temp_filename)
-        play(audio)
-        
-        # Cleanup
-        os.unlink(temp_filename)
-        
+        start_time = time.perf_counter()
+        if pyaudio is not None:
+            audio, stream = open_audio_output()
+
+        # With an output stream the first chunk is played while it downloads;
+        # the rest are synthesized at most `workers` chunks ahead of playback
+        pending = deque()
+        next_index = 1 if stream else 0
+
+        def prefetch():
+            nonlocal next_index
+            while next_index < len(chunks) and len(pending) < workers:
+                pending.append(executor.submit(get_pcm, chunks[next_index]))
+                next_index += 1
+
+        prefetch()
+        if stream:
+            first_chunk = stream_pcm(chunks[0])
+            try:
+                mark_first_audio(write_pcm(stream, first_chunk, cancel))
+            finally:
+                # Closing early aborts the download and skips caching a partial chunk
+                first_chunk.close()
+
+        while pending and not cancelled():
+            pcm = pending.popleft().result()
+            prefetch()
+            if stream:
+                # Back-to-back writes into the same buffer play without gaps
+                mark_first_audio(write_pcm(stream, [pcm], cancel))
+            else:
+                mark_first_audio(play_pcm(pcm, cancel))
+
+        if cancelled():
+            print(f"Playback interrupted after {time.perf_counter() - start_time:.2f} s")
+        else:
+            print(f"Finished speaking in {time.perf_counter() - start_time:.2f} s")
         return True
     except Exception as e:
         print(f"Error converting text to speech: {e}")
         return False
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if stream:
+            stream.stop_stream()
+            stream.close()
+        if audio:
+            audio.terminate()
+
+class SpeechQueue:
+    """Plays speech requests on a worker thread so the hotkey listener never blocks.
+
+    The policy decides what happens when a request arrives while audio is busy:
+    "interrupt" stops the current playback and discards anything queued,
+    "queue" plays requests in order, and "drop-duplicates" queues the request
+    unless the same text is already playing or waiting.
+    """
 
-def on_activate_hotkey():
+    POLICIES = ("interrupt", "queue", "drop-duplicates")
+
+    def __init__(self, policy="interrupt"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {self.POLICIES}")
+        self.policy = policy
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.current_text = None
+        self.current_cancel = None
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'interrupted': 0,
+            'dropped': 0,
+        }
+        self.total_wait = 0.0
+        self.total_first_audio = 0.0
+        self.first_audio_count = 0
+        self.worker = threading.Thread(target=self.run, name="speech-queue", daemon=True)
+        self.worker.start()
+
+    def submit(self, text):
+        """Queue text for playback and return immediately"""
+        with self.condition:
+            self.counters['submitted'] += 1
+            if self.policy == "drop-duplicates":
+                if text == self.current_text or any(job[0] == text for job in self.jobs):
+                    self.counters['dropped'] += 1
+                    print("Same text is already playing or queued, dropping request.")
+                    return False
+            elif self.policy == "interrupt":
+                self.counters['dropped'] += len(self.jobs)
+                self.jobs.clear()
+                if self.current_cancel is not None:
+                    self.current_cancel.set()
+            self.jobs.append((text, time.perf_counter()))
+            self.condition.notify()
+            return True
+
+    def run(self):
+        """Worker loop: play queued requests one at a time"""
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                text, submitted_at = self.jobs.popleft()
+                cancel = threading.Event()
+                self.current_text, self.current_cancel = text, cancel
+
+            wait = time.perf_counter() - submitted_at
+
+            def record_first_audio(timestamp):
+                with self.condition:
+                    self.total_first_audio += timestamp - submitted_at
+                    self.first_audio_count += 1
+
+            ok = speak_text(text, cancel=cancel, on_first_audio=record_first_audio)
+
+            with self.condition:
+                self.current_text, self.current_cancel = None, None
+                self.total_wait += wait
+                if not ok:
+                    self.counters['failed'] += 1
+                elif cancel.is_set():
+                    self.counters['interrupted'] += 1
+                else:
+                    self.counters['completed'] += 1
+            self.print_stats()
+
+    def stats(self):
+        """Snapshot of queue depth, counters and average latencies in milliseconds"""
+        with self.condition:
+            finished = self.counters['completed'] + self.counters['failed'] + self.counters['interrupted']
+            return {
+                'queue_depth': len(self.jobs),
+                'playing': self.current_text is not None,
+                **self.counters,
+                'avg_queue_wait_ms': self.total_wait / finished * 1000 if finished else None,
+                'avg_first_audio_ms': (self.total_first_audio / self.first_audio_count * 1000
+                                       if self.first_audio_count else None),
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        wait = stats['avg_queue_wait_ms']
+        first_audio = stats['avg_first_audio_ms']
+        print(f"Queue depth: {stats['queue_depth']} | completed: {stats['completed']} | "
+              f"interrupted: {stats['interrupted']} | dropped: {stats['dropped']} | failed: {stats['failed']} | "
+              f"avg wait: {f'{wait:.0f} ms' if wait is not None else 'n/a'} | "
+              f"avg hotkey-to-audio: {f'{first_audio:.0f} ms' if first_audio is not None else 'n/a'}")
+
+def on_activate_hotkey(speech_queue):
     """Handle the keyboard shortcut activation"""
+    import pyperclip
     print("Hotkey activated!")
     current_text = pyperclip.paste()
     if current_text.strip():
-        text_to_speech(current_text)
+        speech_queue.submit(current_text)
 
 def main():
     """Main function to set up keyboard shortcut and run the program"""
+    global use_audio_cache
+
+    parser = argparse.ArgumentParser(description='Speak clipboard contents with OpenAI text-to-speech')
+    parser.add_argument('--no-cache', action='store_true', help='Always synthesize instead of using the audio cache')
+    parser.add_argument('--prewarm', type=str, help='File of phrases (one per line) to synthesize into the cache, then exit')
+    parser.add_argument('--policy', choices=SpeechQueue.POLICIES, default='interrupt',
+                        help='What a new request does while audio is playing (default: interrupt)')
+    args = parser.parse_args()
+    if args.prewarm and args.no_cache:
+        parser.error("--prewarm fills the cache and can't be combined with --no-cache")
+
+    if args.no_cache:
+        use_audio_cache = False
+    elif args.prewarm:
+        with open(args.prewarm, encoding='utf-8') as f:
+            phrases = [line.strip() for line in f if line.strip()]
+        added = get_audio_cache().prewarm(phrases)
+        print(f"Cached {added} new audio chunk(s) from {len(phrases)} phrase(s).")
+        return
+
+    from pynput import keyboard
+    speech_queue = SpeechQueue(args.policy)
+
     print("AI Voice Assistant Running...")
     print("Press Command+Shift+V to speak the current clipboard contents")
     print("Press Ctrl+C in the terminal to exit") # pynput doesn't easily handle Ctrl+C exit detection
@@ -76,7 +509,7 @@ def main():
         if key in hotkey_combination:
             current_keys.add(key)
             if all(k in current_keys for k in hotkey_combination):
-                on_activate_hotkey()
+                on_activate_hotkey(speech_queue)
 
     def on_release(key):
         try:
@@ -94,6 +527,7 @@ def main():
     except KeyboardInterrupt:
         print("\nAI Voice Assistant stopping...")
         listener.stop()
+        speech_queue.print_stats()
         print("AI Voice Assistant stopped.")
 
 if __name__ == "__main__":
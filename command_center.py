@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import uuid
+import hmac
+import secrets
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = os.getenv('COMMAND_CENTER_HOST', '127.0.0.1')
+DEFAULT_PORT = int(os.getenv('COMMAND_CENTER_PORT', '8765'))
+# Shared secret every request must carry; taken from COMMAND_CENTER_TOKEN or,
+# failing that, from TOKEN_FILE, which `serve` creates on first start
+TOKEN_FILE = os.getenv('COMMAND_CENTER_TOKEN_FILE', os.path.expanduser('~/.command_center_token'))
+# Host headers accepted, so pages on other origins can't reach the service via DNS rebinding
+ALLOWED_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# Jobs of one type never run more than this many at a time. IMAP/SMTP sessions,
+# the audio output and the CUA container are single shared resources; video
+# jobs run in worker processes.
+CONCURRENCY_LIMITS = {
+    'email': 1,
+    'voice': 1,
+    'video': 2,
+    'cua': 1,
+}
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 500
+
+
+class WarmResources:
+    """Long-lived clients and sessions shared by jobs, created on first use."""
+
+    def __init__(self, video_workers: int = CONCURRENCY_LIMITS['video']):
+        self.video_workers = video_workers
+        self.lock = threading.Lock()
+        self._email = None
+        self._computer_control = None
+        self._video_pool = None
+
+    def email_client(self, connect: bool = True):
+        """EmailClient with live IMAP and SMTP sessions, reconnecting any that went stale."""
+        with self.lock:
+            if self._email is None:
+                from email_client import EmailClient
+                self._email = EmailClient()
+            client = self._email
+
+        if not connect:
+            return client
+        if client.imap:
+            try:
+                client.imap.noop()
+            except Exception:
+                logger.info("IMAP session expired, reconnecting")
+                client.imap = None
+        if client.smtp:
+            try:
+                client.smtp.noop()
+            except Exception:
+                logger.info("SMTP session expired, reconnecting")
+                client.smtp = None
+        if not client.imap:
+            client.connect_imap()
+        if not client.smtp:
+            client.connect_smtp()
+        return client
+
+    def computer_control(self):
+        """ComputerControl whose container stays up between tasks."""
+        with self.lock:
+            if self._computer_control is None:
+                from computer_control import ComputerControl
+                self._computer_control = ComputerControl()
+            return self._computer_control
+
+    def video_pool(self):
+        """Worker processes for video jobs; they keep moviepy/numpy imported between jobs."""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with self.lock:
+            if self._video_pool is None:
+                # Spawn rather than fork: the pool starts from a job thread while other
+                # threads may hold locks (logging's, the scheduler's) a fork would copy
+                self._video_pool = ProcessPoolExecutor(max_workers=self.video_workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+            return self._video_pool
+
+    def close(self):
+        """Shut down everything that was started."""
+        if self._email:
+            self._email.close_connections()
+        if self._computer_control:
+            self._computer_control.close_input()
+        if self._computer_control and self._computer_control.docker:
+            self._computer_control.docker.stop_container()
+        if self._video_pool:
+            self._video_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def handle_email_check(resources, params):
+    return resources.email_client().get_unread_emails()
+
+def handle_email_summarize(resources, params):
+    client = resources.email_client()
+    return client.summarize_emails(client.get_unread_emails())
+
+def handle_email_send(resources, params):
+    client = resources.email_client()
+    if not client.send_email(params['recipient'], params['subject'], params['body']):
+        raise RuntimeError("Failed to send email")
+    return True
+
+def handle_email_sync(resources, params):
+    return resources.email_client().sync_index()
+
+def handle_email_search(resources, params):
+    # Searching the local index needs no server connection
+    client = resources.email_client(connect=False)
+    return client.search_index(params['query'], int(params.get('limit', 10)))
+
+def handle_voice_speak(resources, params):
+    import ai_voice
+    if not ai_voice.speak_text(params['text']):
+        raise RuntimeError("Text to speech failed")
+    return True
+
+def handle_video_crop(resources, params):
+    import crop_video
+    future = resources.video_pool().submit(
+        crop_video.crop_for_social_media,
+        params['input_file'],
+        params.get('output_file'),
+        params.get('quality', 'lanczos'),
+        params.get('backend', 'moviepy'),
+        int(params.get('workers', 1)),
+    )
+    output_file = future.result()
+    if output_file is None:
+        raise FileNotFoundError(params['input_file'])
+    return output_file
+
+def handle_video_clips(resources, params):
+    import crop_video
+    ranges = params['ranges']
+    if isinstance(ranges, str):
+        ranges = crop_video.parse_ranges(ranges)
+    future = resources.video_pool().submit(
+        crop_video.extract_clips,
+        params['input_file'],
+        [tuple(r) for r in ranges],
+        params.get('output_dir'),
+        params.get('quality', 'lanczos'),
+        params.get('backend', 'moviepy'),
+    )
+    return future.result()
+
+def handle_cua_run(resources, params):
+    control = resources.computer_control()
+    control.click_locations.clear()
+    control.run_cua_loop(params.get('instruction'), keep_container=True,
+                         checkpoint_path=params.get('checkpoint'), resume=params.get('resume', False))
+    return control.last_response_id
+
+JOB_HANDLERS = {
+    'email.check': handle_email_check,
+    'email.summarize': handle_email_summarize,
+    'email.send': handle_email_send,
+    'email.sync': handle_email_sync,
+    'email.search': handle_email_search,
+    'voice.speak': handle_voice_speak,
+    'video.crop': handle_video_crop,
+    'video.clips': handle_video_clips,
+    'cua.run': handle_cua_run,
+}
+
+
+class JobScheduler:
+    """Runs jobs on one bounded thread pool per job category (the part before the dot)."""
+
+    def __init__(self, resources: WarmResources, limits: dict = None):
+        self.resources = resources
+        self.limits = dict(CONCURRENCY_LIMITS, **(limits or {}))
+        self.pools = {
+            category: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"{category}-job")
+            for category, limit in self.limits.items()
+        }
+        self.jobs = {}
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def submit(self, job_type: str, params: dict = None) -> dict:
+        """Queue a job and return its record immediately."""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'type': job_type,
+            'params': params or {},
+            'status': 'queued',
+            'result': None,
+            'error': None,
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'done': threading.Event(),
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+        self.pools[job_type.split('.')[0]].submit(self._run, job)
+        logger.info(f"Queued {job_type} job {job['id']}")
+        return job
+
+    def _run(self, job: dict) -> None:
+        job['status'] = 'running'
+        job['started'] = time.time()
+        try:
+            job['result'] = JOB_HANDLERS[job['type']](self.resources, job['params'])
+            job['status'] = 'done'
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['type']}) failed: {e}")
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            job['finished'] = time.time()
+            job['done'].set()
+            logger.info(f"Job {job['id']} {job['status']} in {job['finished'] - job['started']:.2f}s "
+                        f"(queued {job['started'] - job['submitted']:.2f}s)")
+            self._forget_old_jobs(job)
+
+    def _forget_old_jobs(self, job: dict) -> None:
+        with self.lock:
+            self.finished.append(job['id'])
+            while len(self.finished) > MAX_FINISHED_JOBS:
+                self.jobs.pop(self.finished.pop(0), None)
+
+    def get(self, job_id: str) -> dict:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def status(self) -> dict:
+        """Queued and running job counts per category, plus OpenAI request metrics."""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        summary = {}
+        for category, limit in self.limits.items():
+            in_category = [job for job in jobs if job['type'].split('.')[0] == category]
+            summary[category] = {
+                'limit': limit,
+                'queued': sum(job['status'] == 'queued' for job in in_category),
+                'running': sum(job['status'] == 'running' for job in in_category),
+            }
+        # Only report metrics if a job has loaded the gateway; importing it here would pull in openai
+        gateway = sys.modules.get('openai_gateway')
+        summary['openai'] = gateway.gateway_metrics() if gateway else {}
+        return summary
+
+    def shutdown(self) -> None:
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.resources.close()
+
+
+def load_token(create: bool = False) -> str:
+    """The shared API token, generated into TOKEN_FILE (readable only by the user) if create is set."""
+    token = os.getenv('COMMAND_CENTER_TOKEN')
+    if token:
+        return token
+    if os.path.exists(TOKEN_FILE):
+        with open(TOKEN_FILE) as f:
+            return f.read().strip()
+    if not create:
+        raise RuntimeError(f"No API token: set COMMAND_CENTER_TOKEN or start the service to create {TOKEN_FILE}")
+    token = secrets.token_urlsafe(32)
+    fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    logger.info(f"Created API token in {TOKEN_FILE}")
+    return token
+
+
+def job_view(job: dict) -> dict:
+    """JSON-safe view of a job record."""
+    view = {key: value for key, value in job.items() if key != 'done'}
+    try:
+        json.dumps(view['result'])
+    except (TypeError, ValueError):
+        view['result'] = repr(view['result'])
+    return view
+
+
+class CommandCenterHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs           {"type": "email.check", "params": {...}}  (add ?wait=1 to block until done)
+    GET  /jobs/<id>      job status and result
+    GET  /status         queue, concurrency and OpenAI request summary
+
+    Every request needs "Authorization: Bearer <token>" and a localhost Host
+    header; POST bodies must be sent as application/json, which browsers can't
+    do cross-origin without a preflight this server never approves.
+    """
+
+    scheduler: JobScheduler = None
+    token: str = None
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        """Check Host and token, sending an error response if the request is refused."""
+        host = self.headers.get('Host', '')
+        hostname = host.rsplit(':', 1)[0] if not host.startswith('[') else host[1:].split(']', 1)[0]
+        if hostname not in ALLOWED_HOSTS:
+            self._send_json(403, {'error': 'Host not allowed'})
+            return False
+        scheme, _, token = self.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), self.token.encode()):
+            self._send_json(401, {'error': 'Missing or invalid token'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path == '/status':
+            self._send_json(200, self.scheduler.status())
+        elif path.startswith('/jobs/'):
+            job = self.scheduler.get(path[len('/jobs/'):])
+            if job is None:
+                self._send_json(404, {'error': 'Unknown job'})
+            else:
+                self._send_json(200, job_view(job))
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        path, _, query = self.path.partition('?')
+        if path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+            self._send_json(415, {'error': 'Content-Type must be application/json'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('Request body must be a JSON object')
+            if not isinstance(request.get('type'), str):
+                raise ValueError('"type" must be a string')
+            if not isinstance(request.get('params', {}), (dict, type(None))):
+                raise ValueError('"params" must be an object')
+            job = self.scheduler.submit(request['type'], request.get('params'))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        if 'wait=1' in query.split('&'):
+            job['done'].wait()
+        self._send_json(202 if job['status'] in ('queued', 'running') else 200, job_view(job))
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    """Run the command center until interrupted."""
+    scheduler = JobScheduler(WarmResources())
+    CommandCenterHandler.scheduler = scheduler
+    CommandCenterHandler.token = load_token(create=True)
+    server = ThreadingHTTPServer((host, port), CommandCenterHandler)
+    logger.info(f"Command center listening on http://{host}:{port}")
+    logger.info(f"Job types: {', '.join(sorted(JOB_HANDLERS))}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        server.server_close()
+        scheduler.shutdown()
+
+
+def request_json(method: str, url: str, payload: dict = None) -> dict:
+    """Minimal JSON-over-HTTP client for talking to a running command center."""
+    import urllib.request
+    import urllib.error
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    headers = {'Content-Type': 'application/json', 'Authorization': f"Bearer {load_token()}"}
+    req = urllib.request.Request(url, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+
+def parse_params(pairs: list) -> dict:
+    """Turn key=value arguments into a params dict, decoding JSON values where possible."""
+    params = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition('=')
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command center service: runs the tools as jobs in one warm process.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to serve on / connect to.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to serve on / connect to.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("serve", help="Run the service.")
+
+    submit_parser = subparsers.add_parser("submit", help="Submit a job to a running service.")
+    submit_parser.add_argument("type", choices=sorted(JOB_HANDLERS), help="Job type.")
+    submit_parser.add_argument("params", nargs="*", help="Job parameters as key=value.")
+    submit_parser.add_argument("--wait", action="store_true", help="Wait for the job to finish.")
+
+    status_parser = subparsers.add_parser("status", help="Show service or job status.")
+    status_parser.add_argument("job_id", nargs="?", help="Job to show (default: service summary).")
+
+    args = parser.parse_args()
+    base_url = f"http://{args.host}:{args.port}"
+
+    if args.command == "serve":
+        serve(args.host, args.port)
+    elif args.command == "submit":
+        url = f"{base_url}/jobs" + ("?wait=1" if args.wait else "")
+        result = request_json("POST", url, {"type": args.type, "params": parse_params(args.params)})
+        print(json.dumps(result, indent=2))
+    elif args.command == "status":
+        url = f"{base_url}/jobs/{args.job_id}" if args.job_id else f"{base_url}/status"
+        print(json.dumps(request_json("GET", url), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,15 @@
 import os
+import json
 import base64
 import argparse
 import time
 import logging
 import subprocess
-from openai import OpenAI
-from PIL import Image, ImageDraw
 import io
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 from cua_docker import CuaDocker
+from vnc_client import VncClient
 
 # Configure logging
 logging.basicConfig(
@@ -18,63 +18,164 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# "xdotool" runs a docker exec per input event and grabs screenshots with xwd;
+# "vnc" keeps one RFB connection to the container's x11vnc for input and capture
+INPUT_BACKENDS = ("xdotool", "vnc")
+DEFAULT_INPUT_BACKEND = os.getenv("CUA_INPUT_BACKEND", "xdotool")
+VNC_HOST = os.getenv("VNC_HOST", "localhost")
+VNC_PORT = int(os.getenv("VNC_PORT", "5900"))
+VNC_PASSWORD = os.getenv("VNC_PASSWORD", "secret")
+# Loop state written after every step so an interrupted task can be resumed
+CHECKPOINT_PATH = os.getenv("CUA_CHECKPOINT", "cua_checkpoint.json")
+
 class ComputerControl:
-    def __init__(self, display_width: int = 1024, display_height: int = 768, environment: str = "browser"):
-        self.client = OpenAI()
+    def __init__(self, display_width: int = 1024, display_height: int = 768, environment: str = "browser",
+                 input_backend: str = DEFAULT_INPUT_BACKEND):
+        if input_backend not in INPUT_BACKENDS:
+            raise ValueError(f"Unknown input backend: {input_backend}")
         self.display_width = display_width
         self.display_height = display_height
         self.environment = environment
+        self.input_backend = input_backend
         self.last_response_id = None
         self.last_call_id = None
+        self.instruction = None
+        self.step = 0
+        self.action_history: List[Dict[str, Any]] = []
         self.docker = None
+        self.vnc: Optional[VncClient] = None
         self.click_locations: List[Tuple[int, int]] = []
+        # Set when a run ends unfinished with its checkpoint saved and its container left running
+        self.checkpoint_pending = False
         
         # Create screenshots directory
         self.screenshots_dir = "cua_screenshots"
         os.makedirs(self.screenshots_dir, exist_ok=True)
 
-    def mark_click_location(self, img: Image.Image, x: int, y: int) -> Image.Image:
+    @property
+    def gateway(self):
+        """Shared OpenAI gateway; openai is only imported once the model is called."""
+        from openai_gateway import get_gateway
+        return get_gateway()
+
+    def vnc_client(self) -> VncClient:
+        """Persistent connection to the container's VNC server, (re)connected on first use."""
+        if self.vnc is None or not self.vnc.alive:
+            if self.vnc is not None:
+                self.vnc.close()
+            self.vnc = VncClient(VNC_HOST, VNC_PORT, VNC_PASSWORD)
+            self.vnc.connect()
+        return self.vnc
+
+    def close_input(self) -> None:
+        """Drop the VNC connection, e.g. before the container is stopped."""
+        if self.vnc is not None:
+            self.vnc.close()
+            self.vnc = None
+
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        if self.input_backend == "vnc":
+            self.vnc_client().click(x, y, button)
+        else:
+            self.docker.execute_command(f"xdotool mousemove {x} {y} click 1")
+        self.click_locations.append((x, y))
+
+    def double_click(self, x: int, y: int) -> None:
+        if self.input_backend == "vnc":
+            self.vnc_client().click(x, y, count=2)
+        else:
+            self.docker.execute_command(f"xdotool mousemove {x} {y} click --repeat 2 1")
+        self.click_locations.append((x, y))
+
+    def move(self, x: int, y: int) -> None:
+        if self.input_backend == "vnc":
+            self.vnc_client().move(x, y)
+        else:
+            self.docker.execute_command(f"xdotool mousemove {x} {y}")
+
+    def drag(self, path: List[Tuple[int, int]]) -> None:
+        """Press at the first point, move through the rest and release at the last."""
+        if self.input_backend == "vnc":
+            self.vnc_client().drag(path)
+        else:
+            (x, y), rest = path[0], path[1:]
+            moves = " ".join(f"mousemove {x} {y}" for x, y in rest)
+            self.docker.execute_command(f"xdotool mousemove {x} {y} mousedown 1 {moves} mouseup 1")
+
+    def type_text(self, text: str) -> None:
+        if self.input_backend == "vnc":
+            self.vnc_client().type_text(text)
+        else:
+            self.docker.execute_command(f"xdotool type '{text}'")
+
+    def press_keys(self, keys: List[str]) -> None:
+        if self.input_backend == "vnc":
+            self.vnc_client().keypress(keys)
+        else:
+            for key in keys:
+                self.docker.execute_command(f"xdotool key {key}")
+
+    def wait_for_screen(self) -> None:
+        """Give the last action time to take effect before the next screenshot."""
+        if self.input_backend == "vnc":
+            # Returns once the screen has stopped changing, at most after the old fixed delay
+            self.vnc_client().wait_until_idle(idle=0.3, timeout=1.0)
+        else:
+            time.sleep(1)
+
+    def mark_click_location(self, img: "Image.Image", x: int, y: int) -> "Image.Image":
         """Draw a red dot at the click location."""
+        from PIL import ImageDraw
         draw = ImageDraw.Draw(img)
         dot_radius = 5
         draw.ellipse([(x - dot_radius, y - dot_radius), (x + dot_radius, y + dot_radius)], fill='red')
         return img
 
+    def grab_xwd_screenshot(self) -> "Image.Image":
+        """Screenshot taken inside the container with xwd and copied out."""
+        # Use xwd to capture the screen in the container
+        self.docker.execute_command("xwd -root -out /tmp/screenshot.xwd")
+        
+        # Convert xwd to png
+        self.docker.execute_command("convert /tmp/screenshot.xwd /tmp/screenshot.png")
+        
+        # Copy the screenshot from container to host
+        subprocess.run([
+            "docker", "cp", 
+            f"{self.docker.container_name}:/tmp/screenshot.png", 
+            "/tmp/screenshot.png"
+        ], check=True)
+        
+        from PIL import Image
+        with open("/tmp/screenshot.png", "rb") as f:
+            img = Image.open(f)
+            img.load()
+        return img
+
     def capture_screenshot(self) -> io.BytesIO:
         """Captures the container's screenshot and marks click locations."""
         try:
-            # Use xwd to capture the screen in the container
-            self.docker.execute_command("xwd -root -out /tmp/screenshot.xwd")
+            if self.input_backend == "vnc":
+                # Already on the host: copy of the framebuffer kept by the VNC connection
+                img = self.vnc_client().screenshot()
+            else:
+                img = self.grab_xwd_screenshot()
             
-            # Convert xwd to png
-            self.docker.execute_command("convert /tmp/screenshot.xwd /tmp/screenshot.png")
+            # Mark all click locations
+            for x, y in self.click_locations:
+                img = self.mark_click_location(img, x, y)
             
-            # Copy the screenshot from container to host
-            subprocess.run([
-                "docker", "cp", 
-                f"{self.docker.container_name}:/tmp/screenshot.png", 
-                "/tmp/screenshot.png"
-            ], check=True)
+            # Save screenshot to file
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            screenshot_path = os.path.join(self.screenshots_dir, f"screenshot_{timestamp}.png")
+            img.save(screenshot_path)
+            logger.info(f"Screenshot saved to {screenshot_path}")
             
-            # Read and process the image
-            with open("/tmp/screenshot.png", "rb") as f:
-                img = Image.open(f)
-                
-                # Mark all click locations
-                for x, y in self.click_locations:
-                    img = self.mark_click_location(img, x, y)
-                
-                # Save screenshot to file
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                screenshot_path = os.path.join(self.screenshots_dir, f"screenshot_{timestamp}.png")
-                img.save(screenshot_path)
-                logger.info(f"Screenshot saved to {screenshot_path}")
-                
-                # Also return buffer for API
-                buffer = io.BytesIO()
-                img.save(buffer, format="PNG")
-                buffer.seek(0)
-                return buffer
+            # Also return buffer for API
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG")
+            buffer.seek(0)
+            return buffer
                 
         except Exception as e:
             logger.error(f"Error capturing screenshot: {e}")
@@ -97,25 +198,44 @@ class ComputerControl:
                 x, y = getattr(action, "x", 0), getattr(action, "y", 0)
                 button = getattr(action, "button", "left")
                 logger.info(f"Clicking at ({x}, {y}) with {button} button")
-                self.docker.execute_command(f"xdotool mousemove {x} {y} click 1")
-                self.click_locations.append((x, y))
+                self.click(x, y, button)
+                
+            elif action_type == "double_click":
+                x, y = getattr(action, "x", 0), getattr(action, "y", 0)
+                logger.info(f"Double-clicking at ({x}, {y})")
+                self.double_click(x, y)
+                
+            elif action_type == "move":
+                x, y = getattr(action, "x", 0), getattr(action, "y", 0)
+                logger.info(f"Moving the pointer to ({x}, {y})")
+                self.move(x, y)
+                
+            elif action_type == "drag":
+                # Path points arrive as objects or, from a checkpoint, as dicts
+                path = [(point["x"], point["y"]) if isinstance(point, dict) else (point.x, point.y)
+                        for point in getattr(action, "path", [])]
+                logger.info(f"Dragging along {path}")
+                if path:
+                    self.drag(path)
                 
             elif action_type == "type":
                 text = getattr(action, "text", "")
                 logger.info(f"Typing: {text}")
-                self.docker.execute_command(f"xdotool type '{text}'")
+                self.type_text(text)
                 
             elif action_type == "keypress":
                 keys = getattr(action, "keys", [])
                 logger.info(f"Pressing keys: {keys}")
-                for key in keys:
-                    self.docker.execute_command(f"xdotool key {key}")
+                self.press_keys(keys)
                 
             elif action_type == "scroll":
                 x, y = getattr(action, "x", 0), getattr(action, "y", 0)
                 scroll_x, scroll_y = getattr(action, "scroll_x", 0), getattr(action, "scroll_y", 0)
                 logger.info(f"Scrolling at ({x}, {y}) with offsets ({scroll_x}, {scroll_y})")
-                self.docker.execute_command(f"xdotool mousemove {x} {y} click 4")  # Scroll up
+                if self.input_backend == "vnc":
+                    self.vnc_client().scroll(x, y, scroll_x, scroll_y)
+                else:
+                    self.docker.execute_command(f"xdotool mousemove {x} {y} click 4")  # Scroll up
                 
             elif action_type == "wait":
                 wait_time = getattr(action, "time", 2)
@@ -154,18 +274,16 @@ class ComputerControl:
             for action in actions:
                 if action[0] == "click":
                     _, x, y = action
-                    self.docker.execute_command(f"xdotool mousemove {x} {y} click 1")
-                    self.click_locations.append((x, y))
-                    time.sleep(1)
+                    self.click(x, y)
+                    self.wait_for_screen()
                 elif action[0] == "type":
                     _, text = action
-                    self.docker.execute_command(f"xdotool type '{text}'")
-                    time.sleep(1)
+                    self.type_text(text)
+                    self.wait_for_screen()
                 elif action[0] == "keypress":
                     _, keys = action
-                    for key in keys:
-                        self.docker.execute_command(f"xdotool key {key}")
-                    time.sleep(1)
+                    self.press_keys(keys)
+                    self.wait_for_screen()
                 elif action[0] == "wait":
                     _, duration = action
                     time.sleep(duration)
@@ -176,52 +294,145 @@ class ComputerControl:
             logger.error(f"Error in hardcoded sequence: {str(e)}")
             raise
 
-    def run_cua_loop(self, instruction: str) -> None:
-        """Run the CUA loop to execute computer actions based on the model's suggestions."""
+    def save_checkpoint(self, path: Optional[str], phase: str) -> None:
+        """Atomically write the loop state.
+
+        phase is "awaiting_action" (the model's last action has not run yet),
+        "action_done" (it ran, but its screenshot was not sent) or "completed".
+        """
+        if not path:
+            return
+        state = {
+            "instruction": self.instruction,
+            "container_name": self.docker.container_name if self.docker else None,
+            "display_width": self.display_width,
+            "display_height": self.display_height,
+            "environment": self.environment,
+            "last_response_id": self.last_response_id,
+            "last_call_id": self.last_call_id,
+            "step": self.step,
+            "phase": phase,
+            "click_locations": self.click_locations,
+            "action_history": self.action_history,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, path: str) -> Dict[str, Any]:
+        """Restore the loop state saved by save_checkpoint."""
+        with open(path) as f:
+            state = json.load(f)
+        self.instruction = state["instruction"]
+        self.display_width = state["display_width"]
+        self.display_height = state["display_height"]
+        self.environment = state["environment"]
+        self.last_response_id = state["last_response_id"]
+        self.last_call_id = state["last_call_id"]
+        self.step = state["step"]
+        self.click_locations = [tuple(point) for point in state["click_locations"]]
+        self.action_history = state["action_history"]
+        return state
+
+    @staticmethod
+    def describe_action(action: Any) -> Dict[str, Any]:
+        """JSON-safe form of a model action for the checkpoint history."""
+        if hasattr(action, "model_dump"):
+            return action.model_dump()
+        return {key: value for key, value in vars(action).items() if not key.startswith("_")}
+
+    def run_cua_loop(self, instruction: Optional[str], keep_container: bool = False,
+                     checkpoint_path: Optional[str] = None, resume: bool = False) -> None:
+        """Run the CUA loop to execute computer actions based on the model's suggestions.
+
+        An already running container is reused. With keep_container=True it is
+        also left running afterwards, so the next task skips the build and startup.
+
+        With checkpoint_path, the loop state is saved after every step and the
+        container is left running if the task does not finish. resume=True picks
+        up from that checkpoint: it reattaches to the container, skips the build
+        and the hardcoded sequence and continues from the last model response.
+        """
         logger.info("Initializing CUA loop...")
+        completed = False
+        self.checkpoint_pending = False
         
         try:
-            # Start Docker container
-            self.docker = CuaDocker()
-            self.docker.build_image()
-            self.docker.start_container()
-            
-            # Perform initial Instagram setup
-            self.execute_hardcoded_sequence()
-            
-            # Capture initial screenshot
-            screenshot_buffer = self.capture_screenshot()
-            base64_image = self.encode_image(screenshot_buffer)
-            
-            # Create initial request
-            response = self.client.responses.create(
-                model="computer-use-preview",
-                tools=[{
-                    "type": "computer_use_preview",
-                    "display_width": self.display_width,
-                    "display_height": self.display_height,
-                    "environment": self.environment
-                }],
-                input=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "input_text", "text": instruction},
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/png;base64,{base64_image}"
-                        }
-                    ]
-                }],
-                truncation="auto"
-            )
-            
-            self.last_response_id = response.id
+            phase = None
+            if resume:
+                state = self.load_checkpoint(checkpoint_path)
+                phase = state["phase"]
+                if instruction and instruction != self.instruction:
+                    logger.warning(f"Resuming the checkpointed task instead: {self.instruction}")
+                if phase == "completed":
+                    logger.info("Checkpointed task already completed. Nothing to resume.")
+                    completed = True
+                    return
+                if not (self.docker and self.docker.container_id):
+                    self.docker = CuaDocker(state["container_name"])
+                    if not self.docker.attach():
+                        raise RuntimeError(f"Container {state['container_name']} is no longer running; "
+                                           f"the task cannot be resumed and has to be started again")
+                logger.info(f"Resuming at step {self.step} from response {self.last_response_id}")
+                response = self.gateway.call("responses.retrieve", dedupe=False,
+                                             response_id=self.last_response_id)
+            else:
+                self.instruction = instruction
+                self.step = 0
+                self.action_history = []
+                # Drop the previous task's checkpoint so a failure before the first step
+                # can't make --resume pick up that unrelated task
+                if checkpoint_path and os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+
+                # Start Docker container unless a warm one is already attached
+                if not (self.docker and self.docker.container_id):
+                    self.docker = CuaDocker()
+                    self.docker.build_image()
+                    self.docker.start_container()
+                
+                # Perform initial Instagram setup
+                self.execute_hardcoded_sequence()
+                
+                # Capture initial screenshot
+                screenshot_buffer = self.capture_screenshot()
+                base64_image = self.encode_image(screenshot_buffer)
+                
+                # Create initial request
+                response = self.gateway.call(
+                    "responses.create",
+                    dedupe=False,
+                    model="computer-use-preview",
+                    tools=[{
+                        "type": "computer_use_preview",
+                        "display_width": self.display_width,
+                        "display_height": self.display_height,
+                        "environment": self.environment
+                    }],
+                    input=[{
+                        "role": "user",
+                        "content": [
+                            {"type": "input_text", "text": self.instruction},
+                            {
+                                "type": "input_image",
+                                "image_url": f"data:image/png;base64,{base64_image}"
+                            }
+                        ]
+                    }],
+                    truncation="auto"
+                )
+                
+                self.last_response_id = response.id
             
             while True:
                 # Find computer calls in the response
                 computer_calls = [item for item in response.output if getattr(item, "type", None) == "computer_call"]
                 if not computer_calls:
                     logger.info("No more computer calls. Task completed.")
+                    completed = True
+                    self.save_checkpoint(checkpoint_path, "completed")
                     break
                     
                 computer_call = computer_calls[0]
@@ -241,16 +452,29 @@ class ComputerControl:
                 else:
                     acknowledged_checks = []
                 
-                # Execute the action
-                self.execute_action(action)
-                time.sleep(1)  # Allow time for changes to take effect
+                if phase == "action_done":
+                    # The interrupted run already performed this action; only its screenshot is missing
+                    logger.info("Last action was already executed before the interruption, not repeating it")
+                else:
+                    self.save_checkpoint(checkpoint_path, "awaiting_action")
+                    
+                    # Execute the action
+                    self.execute_action(action)
+                    self.step += 1
+                    self.action_history.append({"step": self.step, "call_id": self.last_call_id,
+                                                "action": self.describe_action(action)})
+                    self.save_checkpoint(checkpoint_path, "action_done")
+                    self.wait_for_screen()  # Allow time for changes to take effect
+                phase = None
                 
                 # Capture new screenshot
                 screenshot_buffer = self.capture_screenshot()
                 base64_image = self.encode_image(screenshot_buffer)
                 
                 # Send updated state to model
-                response = self.client.responses.create(
+                response = self.gateway.call(
+                    "responses.create",
+                    dedupe=False,
                     model="computer-use-preview",
                     previous_response_id=self.last_response_id,
                     tools=[{
@@ -277,26 +501,49 @@ class ComputerControl:
             logger.error(f"Error in CUA loop: {e}")
             raise
         finally:
-            if self.docker:
+            self.checkpoint_pending = bool(checkpoint_path and not completed and os.path.exists(checkpoint_path)
+                                           and self.docker and self.docker.container_id)
+            if self.checkpoint_pending:
+                logger.info(f"Container {self.docker.container_name} left running; "
+                            f"continue with --resume (checkpoint: {checkpoint_path})")
+            elif self.docker and not keep_container:
+                self.close_input()
                 self.docker.stop_container()
 
 def main():
     parser = argparse.ArgumentParser(description="Control computer using OpenAI's Computer-Using Agent.")
-    parser.add_argument("--instruction", required=True, help="Natural language instruction for the computer task.")
+    parser.add_argument("--instruction", help="Natural language instruction for the computer task.")
     parser.add_argument("--display-width", type=int, default=1024, help="Display width for the virtual environment.")
     parser.add_argument("--display-height", type=int, default=768, help="Display height for the virtual environment.")
     parser.add_argument("--environment", default="browser", choices=["browser", "mac", "windows", "ubuntu"],
                       help="Environment type for the computer agent.")
+    parser.add_argument("--input-backend", default=DEFAULT_INPUT_BACKEND, choices=INPUT_BACKENDS,
+                      help="Send input and capture screenshots via xdotool in the container or over VNC.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                      help="File the loop state is saved to after every step.")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                      help="Don't save checkpoints; the container is stopped even if the task fails.")
+    parser.add_argument("--resume", action="store_true",
+                      help="Continue the checkpointed task in its still running container.")
     
     args = parser.parse_args()
+    if args.resume and args.no_checkpoint:
+        parser.error("--resume needs a checkpoint")
+    if not args.instruction and not args.resume:
+        parser.error("--instruction is required unless resuming")
     
     try:
         computer_control = ComputerControl(
             display_width=args.display_width,
             display_height=args.display_height,
-            environment=args.environment
+            environment=args.environment,
+            input_backend=args.input_backend
+        )
+        computer_control.run_cua_loop(
+            args.instruction,
+            checkpoint_path=None if args.no_checkpoint else args.checkpoint,
+            resume=args.resume
         )
-        computer_control.run_cua_loop(args.instruction)
     except Exception as e:
         logger.error(f"An error occurred: {e}")
         raise
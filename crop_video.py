@@ -1,25 +1,536 @@
 #!/usr/bin/env python3
-from moviepy.editor import VideoFileClip, CompositeVideoClip, ColorClip
-import numpy as np
-from PIL import Image
+from contextlib import contextmanager
+import argparse
+import bisect
+import gc
+import hashlib
+import json
 import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-def custom_resize(clip, newsize):
-    """Custom resize function to avoid PIL.Image.ANTIALIAS deprecation"""
-    w, h = newsize
-    
-    def resize_frame(frame):
-        img = Image.fromarray(frame)
-        # Use LANCZOS instead of deprecated ANTIALIAS
-        resized_img = img.resize((w, h), Image.LANCZOS)
-        return np.array(resized_img)
-    
-    resized_clip = clip.fl_image(resize_frame)
+# Recommended dimensions for social media (9:16 aspect ratio)
+OUTPUT_WIDTH = 1080
+OUTPUT_HEIGHT = 1920
+TARGET_RATIO = 9/16  # For vertical videos (width:height)
+
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+# Parallel encoding splits inputs into segments of at least this many seconds,
+# a few per worker so one slow segment doesn't leave the other workers idle
+MIN_SEGMENT_SECONDS = 30
+SEGMENTS_PER_WORKER = 2
+SEEK_EPSILON = 0.001
+# Batch mode
+VIDEO_EXTENSIONS = ('.mov', '.mp4', '.m4v', '.mkv', '.avi')
+MANIFEST_NAME = '.crop_manifest.json'
+FINGERPRINT_SAMPLE_BYTES = 1024 * 1024
+# How often track_resources samples the RSS of the ffmpeg child processes
+CHILD_RSS_SAMPLE_SECONDS = 0.2
+WATCH_POLL_SECONDS = 10
+# Audio codecs each output container can take without re-encoding
+AUDIO_COPY_CODECS = {
+    '.mp4': ('aac', 'mp3', 'alac'),
+    '.m4v': ('aac', 'mp3', 'alac'),
+    '.mov': ('aac', 'mp3', 'alac', 'pcm_s16le', 'pcm_s24le'),
+    '.mkv': ('aac', 'mp3', 'opus', 'vorbis', 'flac', 'ac3', 'pcm_s16le', 'pcm_s24le'),
+}
+
+# Output rows/columns are grouped into blocks so each block only multiplies
+# against the band of input pixels its filter taps can reach
+RESIZE_BLOCK_SIZE = 32
+LANCZOS_SUPPORT = 3
+
+def lanczos_weights(in_size, out_size, a=LANCZOS_SUPPORT):
+    """Resampling matrix (out_size x in_size) for a Lanczos filter, laid out like PIL's"""
+    import numpy as np
+    scale = in_size / out_size
+    # When downscaling, the filter is stretched so every input pixel contributes
+    filterscale = max(scale, 1.0)
+    centers = (np.arange(out_size) + 0.5) * scale
+    x = ((np.arange(in_size) + 0.5)[None, :] - centers[:, None]) / filterscale
+    weights = np.sinc(x) * np.sinc(x / a)
+    weights[np.abs(x) >= a] = 0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+def band_blocks(weights, block_size=RESIZE_BLOCK_SIZE):
+    """Split a resampling matrix into (start, stop, lo, hi, block) row bands.
+
+    block holds rows start:stop of weights restricted to the input range lo:hi
+    outside which those rows are all zero.
+    """
+    import numpy as np
+    blocks = []
+    for start in range(0, weights.shape[0], block_size):
+        block = weights[start:start + block_size]
+        nonzero = np.flatnonzero(block.any(axis=0))
+        lo, hi = nonzero[0], nonzero[-1] + 1
+        blocks.append((start, start + block.shape[0], lo, hi, np.ascontiguousarray(block[:, lo:hi])))
+    return blocks
+
+class FrameResizer:
+    """Resizes RGB frames of one fixed size, reusing weights and buffers across frames.
+
+    "lanczos" matches PIL's LANCZOS filter using two banded matrix products per
+    frame. "fast" is nearest-neighbour sampling: much cheaper, but blocky.
+    The returned array is reused by the next call, so consume it first.
+    """
+
+    def __init__(self, in_size, out_size, quality="lanczos"):
+        import numpy as np
+        in_w, in_h = in_size
+        out_w, out_h = out_size
+        self.quality = quality
+        self.output = np.empty((out_h, out_w, 3), dtype=np.uint8)
+
+        if quality == "lanczos":
+            # Horizontal weights are expanded over the 3 interleaved channels so
+            # both passes work on (rows, width * 3) arrays with no transposes
+            wx = np.kron(lanczos_weights(in_w, out_w), np.eye(3, dtype=np.float32))
+            self.x_blocks = [(start, stop, lo, hi, block.T.copy())
+                             for start, stop, lo, hi, block in band_blocks(wx, RESIZE_BLOCK_SIZE * 3)]
+            self.y_blocks = band_blocks(lanczos_weights(in_h, out_h))
+            self.frame_buffer = np.empty((in_h, in_w * 3), dtype=np.float32)
+            self.frame_view = self.frame_buffer.reshape(in_h, in_w, 3)
+            self.rows_buffer = np.empty((in_h, out_w * 3), dtype=np.float32)
+            self.result_buffer = np.empty((out_h, out_w * 3), dtype=np.float32)
+        elif quality == "fast":
+            self.ys = ((np.arange(out_h) + 0.5) * in_h / out_h).astype(np.intp)
+            self.xs = ((np.arange(out_w) + 0.5) * in_w / out_w).astype(np.intp)
+            self.rows_buffer = np.empty((out_h, in_w, 3), dtype=np.uint8)
+        else:
+            raise ValueError(f"Unknown resize quality: {quality}")
+
+    def __call__(self, frame):
+        import numpy as np
+        if self.quality == "fast":
+            np.take(frame, self.ys, axis=0, out=self.rows_buffer)
+            np.take(self.rows_buffer, self.xs, axis=1, out=self.output)
+            return self.output
+
+        # Both passes preserve constants, so adding 0.5 up front makes the
+        # final truncating cast round to nearest. Writing through frame_view also
+        # accepts non-contiguous crop views without an extra copy.
+        np.add(frame, np.float32(0.5), out=self.frame_view)
+        for start, stop, lo, hi, block in self.x_blocks:
+            np.matmul(self.frame_buffer[:, lo:hi], block, out=self.rows_buffer[:, start:stop])
+        # Like PIL, round and clamp the horizontal pass to 0-255 before the vertical
+        # one; otherwise Lanczos overshoot at sharp edges (text, UI) gets amplified
+        np.floor(self.rows_buffer, out=self.rows_buffer)
+        np.clip(self.rows_buffer, 0, 255, out=self.rows_buffer)
+        self.rows_buffer += np.float32(0.5)
+        for start, stop, lo, hi, block in self.y_blocks:
+            np.matmul(block, self.rows_buffer[lo:hi], out=self.result_buffer[start:stop])
+        np.clip(self.result_buffer.reshape(self.output.shape), 0, 255, out=self.output, casting='unsafe')
+        return self.output
+
+def pil_resize_frame(frame, newsize):
+    """Reference per-frame resize through PIL, kept for benchmarking"""
+    import numpy as np
+    from PIL import Image
+    img = Image.fromarray(frame)
+    # Use LANCZOS instead of deprecated ANTIALIAS
+    resized_img = img.resize(newsize, Image.LANCZOS)
+    return np.array(resized_img)
+
+def custom_resize(clip, newsize, quality="lanczos"):
+    """Resize a clip with a FrameResizer built once for the clip's frame size"""
+    resizer = FrameResizer(clip.size, newsize, quality)
+    resized_clip = clip.fl_image(resizer)
     return resized_clip
 
-def crop_for_social_media(input_file, output_file=None):
+def benchmark_resize(in_size=(640, 1080), out_size=(1080, 1920), frames=30):
+    """Compare resize throughput (frames per second) of the PIL path and FrameResizer"""
+    import numpy as np
+    in_w, in_h = in_size
+    rng = np.random.default_rng(0)
+    test_frames = [rng.integers(0, 256, (in_h, in_w, 3), dtype=np.uint8) for _ in range(4)]
+
+    def measure(resize):
+        resize(test_frames[0])  # warm up
+        start = time.perf_counter()
+        for i in range(frames):
+            resize(test_frames[i % len(test_frames)])
+        return frames / (time.perf_counter() - start)
+
+    print(f"Resizing {in_w}x{in_h} -> {out_size[0]}x{out_size[1]}, {frames} frames per method")
+    baseline = measure(lambda frame: pil_resize_frame(frame, out_size))
+    print(f"PIL LANCZOS:          {baseline:7.1f} fps")
+    for quality in ("lanczos", "fast"):
+        fps = measure(FrameResizer(in_size, out_size, quality))
+        print(f"FrameResizer {quality:8s} {fps:7.1f} fps ({fps / baseline:.1f}x)")
+
+def compute_geometry(width, height):
+    """
+    Work out how a width x height source maps onto the 9:16 output.
+    Returns the source region to keep (crop_x, crop_width, full height) and the
+    padded canvas it is centered on (pad_width, pad_x) before scaling to
+    OUTPUT_WIDTH x OUTPUT_HEIGHT. Integer rounding matches MoviePy's crop and
+    compositing so both backends produce the same frame geometry.
+    """
+    # Keep only the right third
+    third_width = width // 3
+    crop_x = width - third_width
+    crop_width = third_width
+    pad_width = third_width
+
+    current_ratio = third_width / height
+    if current_ratio > TARGET_RATIO:  # Too wide
+        # Center-crop the width down to 9:16
+        new_width = int(height * TARGET_RATIO)
+        x_center = third_width / 2
+        x1 = int(x_center - new_width / 2)
+        x2 = int(x_center + new_width / 2)
+        crop_x += x1
+        crop_width = pad_width = x2 - x1
+    elif current_ratio < TARGET_RATIO:  # Too tall
+        # Add black padding on sides
+        pad_width = int(height * TARGET_RATIO)
+
+    return {
+        'crop_x': crop_x,
+        'crop_width': crop_width,
+        'height': height,
+        'pad_width': pad_width,
+        'pad_x': int((pad_width - crop_width) / 2),
+    }
+
+def probe_video(input_file):
+    """Read the video size, duration and audio codec of a file with ffprobe"""
+    result = subprocess.run([
+        FFPROBE_BINARY, "-v", "error",
+        "-show_entries", "stream=codec_type,codec_name,width,height:format=duration",
+        "-of", "json", input_file
+    ], capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout)
+    streams = probe.get("streams", [])
+    video = next(s for s in streams if s.get("codec_type") == "video")
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    return {
+        'width': video['width'],
+        'height': video['height'],
+        'duration': float(probe.get("format", {}).get("duration", 0)),
+        'audio_codec': audio['codec_name'] if audio else None,
+    }
+
+def keyframe_times(input_file):
+    """List the timestamps of video keyframes by reading packet flags (no decoding)"""
+    result = subprocess.run([
+        FFPROBE_BINARY, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0", input_file
+    ], capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            times.append(float(pts_time))
+    return sorted(times)
+
+def plan_segments(keyframes, duration, count):
+    """Split [0, duration) into about `count` (start, end) ranges that begin on keyframes.
+
+    The last range has end None, meaning "to the end of the input".
+    """
+    boundaries = [0.0]
+    for i in range(1, count):
+        target = duration * i / count
+        pos = bisect.bisect_left(keyframes, target)
+        candidates = keyframes[max(pos - 1, 0):pos + 1]
+        if not candidates:
+            break
+        nearest = min(candidates, key=lambda k: abs(k - target))
+        if nearest > boundaries[-1]:
+            boundaries.append(nearest)
+    return list(zip(boundaries, boundaries[1:] + [None]))
+
+def build_filter_chain(geometry, quality="lanczos"):
+    """Compile the crop/pad/scale geometry into one ffmpeg video filter chain"""
+    filters = [f"crop={geometry['crop_width']}:{geometry['height']}:{geometry['crop_x']}:0"]
+    if geometry['pad_width'] > geometry['crop_width']:
+        filters.append(f"pad={geometry['pad_width']}:{geometry['height']}:{geometry['pad_x']}:0:black")
+    scale_flags = "lanczos" if quality == "lanczos" else "neighbor"
+    filters.append(f"scale={OUTPUT_WIDTH}:{OUTPUT_HEIGHT}:flags={scale_flags}")
+    filters.append("setsar=1")
+    filters.append("format=yuv420p")
+    return ",".join(filters)
+
+def audio_codec_args(audio_codec, output_file):
+    """Stream-copy audio the output container can hold as-is; otherwise re-encode to AAC"""
+    ext = os.path.splitext(output_file)[1].lower()
+    if audio_codec in AUDIO_COPY_CODECS.get(ext, ()):
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac"]
+
+def render_ffmpeg(input_file, output_file, geometry, audio_codec=None, quality="lanczos",
+                  start=None, duration=None, threads=None, include_audio=True):
+    """Crop, pad and scale in a single native ffmpeg pass.
+    start/duration (seconds) limit the render to part of the input, seeking on the input side.
+    """
+    input_args = []
+    if start:
+        # Back off slightly so a start exactly on a keyframe never drops that frame
+        # through timestamp rounding; the previous range ends just as far early
+        input_args += ["-ss", f"{max(start - SEEK_EPSILON, 0):.6f}"]
+    if duration is not None:
+        input_args += ["-t", f"{duration:.6f}"]
+    thread_args = ["-threads", str(threads)] if threads else []
+    if include_audio:
+        audio_args = ["-map", "0:a:0?", *audio_codec_args(audio_codec, output_file)]
+    else:
+        audio_args = ["-an"]
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-v", "error", "-stats",
+        *input_args,
+        "-i", input_file,
+        "-map", "0:v:0",
+        "-vf", build_filter_chain(geometry, quality),
+        "-c:v", "libx264",
+        *thread_args,
+        *audio_args,
+        "-movflags", "+faststart",
+        output_file
+    ]
+    subprocess.run(cmd, check=True)
+
+def render_moviepy(clip, output_file, geometry, quality="lanczos", threads=None, include_audio=True):
+    """Crop, pad and scale a loaded clip frame by frame through MoviePy.
+    The caller owns `clip` and must close it; clips created here are released before returning.
+    """
+    from moviepy.editor import CompositeVideoClip, ColorClip
+    bg = composite = None
+    # Crop to the region computed for the right third / 9:16 framing
+    final_clip = clip.crop(x1=geometry['crop_x'],
+                           y1=0,
+                           x2=geometry['crop_x'] + geometry['crop_width'],
+                           y2=geometry['height'])
+
+    if geometry['pad_width'] > geometry['crop_width']:  # Too tall
+        # Create a black background with the target aspect ratio
+        bg = ColorClip((geometry['pad_width'], geometry['height']), color=(0, 0, 0))
+        bg = bg.set_duration(final_clip.duration)
+
+        # Position the original clip at the center
+        positioned_clip = final_clip.set_position(("center", "center"))
+
+        # Composite the clips
+        final_clip = composite = CompositeVideoClip([bg, positioned_clip])
+
+    # Resize to recommended dimensions for social media (1080x1920)
+    final_clip = custom_resize(final_clip, (OUTPUT_WIDTH, OUTPUT_HEIGHT), quality)
+
+    try:
+        # Write the result
+        final_clip.write_videofile(output_file, codec="libx264", audio_codec="aac", audio=include_audio,
+                                   threads=threads)
+    finally:
+        # The crop/resize clips are shallow copies sharing the caller's file readers,
+        # so only the clips that own nothing else are closed here
+        for owned in (composite, bg):
+            if owned is not None:
+                owned.close()
+
+def encode_segment(job):
+    """Process-pool worker: render the video of one time range of the input to its own file.
+
+    Audio is left out: cut at video keyframes, each segment would carry its own
+    audio pre-roll, so concat_segments takes the audio from the source instead.
+    """
+    start, end = job['start'], job['end']
+    if job['backend'] == "ffmpeg":
+        duration = end - start if end is not None else None
+        render_ffmpeg(job['input_file'], job['output_file'], job['geometry'], quality=job['quality'],
+                      start=start, duration=duration, threads=job['threads'], include_audio=False)
+    else:
+        from moviepy.editor import VideoFileClip
+        clip = VideoFileClip(job['input_file'], audio=False)
+        try:
+            # Stop just short of the next segment's first frame (see SEEK_EPSILON)
+            segment = clip.subclip(start, end - SEEK_EPSILON if end is not None else None)
+            render_moviepy(segment, job['output_file'], job['geometry'], job['quality'],
+                           threads=job['threads'], include_audio=False)
+        finally:
+            clip.close()
+    return job['output_file']
+
+def concat_segments(segment_files, output_file, audio_source=None, audio_codec=None):
+    """Join encoded segments without re-encoding the video using ffmpeg's concat demuxer.
+    Audio, if any, is muxed in one piece from audio_source so it stays continuous.
+    """
+    list_file = f"{output_file}.segments.txt"
+    with open(list_file, "w") as f:
+        for path in segment_files:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        audio_input, audio_args = [], []
+        if audio_source and audio_codec:
+            audio_input = ["-i", audio_source]
+            audio_args = ["-map", "1:a:0", *audio_codec_args(audio_codec, output_file)]
+        subprocess.run([
+            FFMPEG_BINARY, "-y", "-v", "error",
+            "-f", "concat", "-safe", "0", "-i", list_file,
+            *audio_input,
+            "-map", "0:v:0", "-c:v", "copy",
+            *audio_args,
+            "-movflags", "+faststart",
+            output_file
+        ], check=True)
+    finally:
+        os.unlink(list_file)
+
+def crop_parallel(input_file, output_file, geometry, info, quality="lanczos", backend="moviepy",
+                  workers=None, min_segment_seconds=MIN_SEGMENT_SECONDS):
+    """Render keyframe-aligned segments in parallel worker processes, then concatenate them"""
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+    count = max(1, min(workers * SEGMENTS_PER_WORKER, int(info['duration'] // min_segment_seconds)))
+    segments = plan_segments(keyframe_times(input_file), info['duration'], count)
+    # Split the machine's cores between the encoders instead of oversubscribing
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Encoding {len(segments)} segment(s) with {workers} worker(s)")
+
+    ext = os.path.splitext(output_file)[1]
+    segment_dir = tempfile.mkdtemp(prefix=".segments_", dir=os.path.dirname(os.path.abspath(output_file)))
+    jobs = [{
+        'input_file': input_file,
+        'output_file': os.path.join(segment_dir, f"segment_{i:04d}{ext}"),
+        'start': start,
+        'end': end,
+        'geometry': geometry,
+        'audio_codec': info['audio_codec'],
+        'quality': quality,
+        'backend': backend,
+        'threads': threads,
+    } for i, (start, end) in enumerate(segments)]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            segment_files = list(executor.map(encode_segment, jobs))
+        concat_segments(segment_files, output_file, input_file, info['audio_codec'])
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+def current_rss_mb():
+    """Resident set size of this process right now, where the platform exposes it"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """High-water mark RSS of this process (or its finished children)"""
+    try:
+        # Since the last reset_peak_rss(), on Linux
+        with open("/proc/self/status") as f:
+            for line in f:
+                if who == resource.RUSAGE_SELF and line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def children_rss_mb():
+    """Combined RSS of all descendants of this process right now (Linux only)"""
+    page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    children, rss = {}, {}
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # Fields after the parenthesised command name: state, ppid, ..., rss (24th overall)
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue  # exited in the meantime
+        children.setdefault(int(fields[1]), []).append(int(pid))
+        rss[int(pid)] = int(fields[21]) * page_mb
+    total, pending = 0.0, list(children.get(os.getpid(), []))
+    while pending:
+        pid = pending.pop()
+        total += rss[pid]
+        pending.extend(children.get(pid, []))
+    return total
+
+def reset_peak_rss():
+    """Restart the peak RSS measurement so it covers only the next job (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def count_open_fds():
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+@contextmanager
+def track_resources(label):
+    """Print time, RSS, peak RSS and open file descriptors for the job run inside the block"""
+    gc.collect()
+    reset_peak_rss()
+    rss_before, fds_before = current_rss_mb(), count_open_fds()
+    # getrusage(RUSAGE_CHILDREN) only knows the largest child of the process's whole
+    # lifetime, so sample the ffmpeg (and worker) processes while this job runs
+    children_peak = children_rss_mb()
+    done = threading.Event()
+
+    def sample_children():
+        nonlocal children_peak
+        while not done.wait(CHILD_RSS_SAMPLE_SECONDS):
+            children_peak = max(children_peak, children_rss_mb())
+
+    sampler = threading.Thread(target=sample_children, daemon=True) if children_peak is not None else None
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        done.set()
+        if sampler:
+            sampler.join()
+        # Collect reference cycles between clips so their frame buffers go now, not later
+        gc.collect()
+        rss_after, fds_after = current_rss_mb(), count_open_fds()
+
+        def mb(value):
+            return f"{value:.0f} MB" if value is not None else "n/a"
+
+        if sampler:
+            children = f"ffmpeg peak RSS {mb(children_peak)}"
+        else:
+            children = f"largest child RSS since start {mb(peak_rss_mb(resource.RUSAGE_CHILDREN))}"
+        print(f"[{label}] {time.perf_counter() - start:.1f}s | "
+              f"RSS {mb(rss_before)} -> {mb(rss_after)} | peak RSS {mb(peak_rss_mb())} | "
+              f"{children} | open fds {fds_before} -> {fds_after}")
+
+def crop_for_social_media(input_file, output_file=None, quality="lanczos", backend="moviepy", workers=1):
     """
     Crop the video to keep only the right third and format it for social media (9:16 aspect ratio).
+    quality is passed to FrameResizer: "lanczos" (default) or the faster, lower quality "fast".
+    backend "ffmpeg" runs the whole pipeline as one native ffmpeg filter chain
+    instead of decoding through MoviePy; both produce the same geometry.
+    workers > 1 splits long inputs into keyframe-aligned segments encoded in
+    parallel processes and joined losslessly afterwards.
     """
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' not found.")
@@ -28,65 +539,295 @@ def crop_for_social_media(input_file, output_file=None):
     if output_file is None:
         filename, ext = os.path.splitext(input_file)
         output_file = f"{filename}_social_media{ext}"
-    
-    # Load the video
-    clip = VideoFileClip(input_file)
-    
-    # Calculate dimensions for right third
-    original_width = clip.w
-    original_height = clip.h
-    crop_width = original_width // 3
-    
-    # Crop to keep only the right third
-    right_third = clip.crop(x1=original_width - crop_width, 
-                            y1=0,
-                            x2=original_width, 
-                            y2=original_height)
-    
-    # Calculate dimensions to match 9:16 aspect ratio
-    target_ratio = 9/16  # For vertical videos (width:height)
-    current_ratio = right_third.w / right_third.h
-    
-    final_clip = None
-    
-    if current_ratio > target_ratio:  # Too wide
-        # Need to crop width
-        new_width = int(right_third.h * target_ratio)
-        x_center = right_third.w / 2
-        final_clip = right_third.crop(x1=x_center - new_width/2,
-                                     y1=0,
-                                     x2=x_center + new_width/2,
-                                     y2=right_third.h)
-    elif current_ratio < target_ratio:  # Too tall
-        # Add black padding on sides
-        new_width = int(right_third.h * target_ratio)
-        padding_width = (new_width - right_third.w) / 2
-        
-        # Create a black background with the target aspect ratio
-        bg = ColorClip((new_width, right_third.h), color=(0, 0, 0))
-        bg = bg.set_duration(right_third.duration)
-        
-        # Position the original clip at the center
-        positioned_clip = right_third.set_position(("center", "center"))
-        
-        # Composite the clips
-        final_clip = CompositeVideoClip([bg, positioned_clip])
-    else:
-        # Already correct ratio
-        final_clip = right_third
-    
-    # Resize to recommended dimensions for social media (1080x1920)
-    width = 1080
-    height = 1920
-    final_clip = custom_resize(final_clip, (width, height))
-    
-    # Write the result
-    final_clip.write_videofile(output_file, codec="libx264", audio_codec="aac")
-    
+
+    with track_resources(os.path.basename(input_file)):
+        if workers > 1:
+            info = probe_video(input_file)
+            geometry = compute_geometry(info['width'], info['height'])
+            crop_parallel(input_file, output_file, geometry, info, quality, backend, workers)
+        elif backend == "ffmpeg":
+            info = probe_video(input_file)
+            geometry = compute_geometry(info['width'], info['height'])
+            render_ffmpeg(input_file, output_file, geometry, info['audio_codec'], quality)
+        else:
+            from moviepy.editor import VideoFileClip
+            # Load the video
+            clip = VideoFileClip(input_file)
+            try:
+                geometry = compute_geometry(clip.w, clip.h)
+                render_moviepy(clip, output_file, geometry, quality)
+            finally:
+                # Stops the ffmpeg reader subprocesses (video and audio) and frees their buffers
+                clip.close()
+
     print(f"Video formatted for social media saved to: {output_file}")
-    print(f"Final dimensions: {width}x{height} (9:16 aspect ratio)")
+    print(f"Final dimensions: {OUTPUT_WIDTH}x{OUTPUT_HEIGHT} (9:16 aspect ratio)")
+    return output_file
+
+def parse_timestamp(value):
+    """Seconds from SS(.ms), MM:SS(.ms) or HH:MM:SS(.ms)"""
+    seconds = 0.0
+    for part in value.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_ranges(spec):
+    """Parse comma- or newline-separated "start-end" ranges; '#' starts a comment"""
+    ranges = []
+    for item in re.split(r"[,\n]", spec):
+        item = item.split("#", 1)[0].strip()
+        if not item:
+            continue
+        start, sep, end = item.partition("-")
+        if not sep:
+            raise ValueError(f"Invalid time range {item!r}, expected start-end")
+        start, end = parse_timestamp(start), parse_timestamp(end)
+        if end <= start:
+            raise ValueError(f"Invalid time range {item!r}, end must be after start")
+        ranges.append((start, end))
+    return ranges
+
+def format_timestamp(seconds):
+    """HHMMSS label for output file names"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}{seconds % 3600 // 60:02d}{seconds % 60:02d}"
+
+def extract_clips(input_file, ranges, output_dir=None, quality="lanczos", backend="moviepy"):
+    """
+    Render only the given (start, end) time ranges of input_file, each to its own
+    9:16 output. The input is opened (and its crop geometry computed) once; each
+    range is reached with an input-side seek, so nothing outside it is decoded.
+    """
+    if not os.path.exists(input_file):
+        print(f"Error: Input file '{input_file}' not found.")
+        return []
+
+    filename, ext = os.path.splitext(os.path.basename(input_file))
+    output_dir = output_dir or os.path.dirname(input_file)
+    os.makedirs(output_dir or ".", exist_ok=True)
+
+    clip = None
+    if backend == "ffmpeg":
+        info = probe_video(input_file)
+        duration = info['duration']
+        geometry = compute_geometry(info['width'], info['height'])
+    else:
+        from moviepy.editor import VideoFileClip
+        clip = VideoFileClip(input_file)
+        duration = clip.duration
+        geometry = compute_geometry(clip.w, clip.h)
+
+    outputs = []
+    try:
+        for idx, (start, end) in enumerate(ranges, 1):
+            if start >= duration:
+                print(f"Skipping range {start:.1f}-{end:.1f}s: starts after the end of the video ({duration:.1f}s)")
+                continue
+            end = min(end, duration)
+            output_file = os.path.join(
+                output_dir, f"{filename}_clip{idx:02d}_{format_timestamp(start)}-{format_timestamp(end)}.mp4")
+            print(f"Rendering clip {idx}: {start:.1f}s to {end:.1f}s")
+            with track_resources(os.path.basename(output_file)):
+                if backend == "ffmpeg":
+                    render_ffmpeg(input_file, output_file, geometry, info['audio_codec'], quality,
+                                  start=start, duration=end - start)
+                else:
+                    # MoviePy's reader restarts ffmpeg with an input-side -ss when jumping ahead
+                    render_moviepy(clip.subclip(start, end), output_file, geometry, quality)
+            outputs.append(output_file)
+            print(f"Clip saved to: {output_file}")
+    finally:
+        if clip is not None:
+            clip.close()
+
+    return outputs
+
+def file_fingerprint(path, sample_bytes=FINGERPRINT_SAMPLE_BYTES):
+    """Cheap content hash of a (possibly huge) recording: its size plus first and last bytes"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(size - sample_bytes, sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+class BatchManifest:
+    """
+    JSON record of batch jobs, keyed by input fingerprint, mtime and settings.
+    Every status change is written to disk immediately (atomically), so a rerun
+    after a crash skips finished outputs and redoes anything left unfinished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def key(self, input_file, settings):
+        payload = json.dumps({
+            'fingerprint': file_fingerprint(input_file),
+            'mtime': os.path.getmtime(input_file),
+            'settings': settings,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_done(self, key):
+        entry = self.entries.get(key)
+        return bool(entry and entry['status'] == "done" and os.path.exists(entry['output_file']))
+
+    def update(self, key, **fields):
+        self.entries.setdefault(key, {}).update(fields)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+def batch_output_path(input_file, output_dir):
+    filename, ext = os.path.splitext(os.path.basename(input_file))
+    return os.path.join(output_dir, f"{filename}_social_media{ext}")
+
+def find_recordings(input_dir):
+    """Video files in input_dir, excluding our own outputs and partial renders"""
+    recordings = []
+    for entry in sorted(os.scandir(input_dir), key=lambda e: e.name):
+        stem, ext = os.path.splitext(entry.name)
+        if (entry.is_file() and ext.lower() in VIDEO_EXTENSIONS
+                and not stem.endswith("_social_media") and not stem.endswith(".partial")
+                and not entry.name.startswith(".")):
+            recordings.append(entry.path)
+    return recordings
+
+def batch_job(job):
+    """Process-pool worker: render one recording via a partial file renamed into place when complete"""
+    filename, ext = os.path.splitext(job['output_file'])
+    partial_file = f"{filename}.partial{ext}"
+    if crop_for_social_media(job['input_file'], partial_file, job['quality'], job['backend'],
+                             job.get('workers', 1)) is None:
+        raise FileNotFoundError(job['input_file'])
+    os.replace(partial_file, job['output_file'])
+    print(f"Finished {job['input_file']} -> {job['output_file']}")
+    return job['output_file']
+
+def process_batch(input_dir, output_dir=None, quality="lanczos", backend="moviepy", jobs=None,
+                  watch=False, poll_interval=WATCH_POLL_SECONDS, manifest_path=None, workers=1):
+    """
+    Run crop_for_social_media over every recording in input_dir using a process pool.
+    With watch=True, keep polling for new recordings; a file is picked up once its
+    size and mtime have stopped changing between two polls. workers > 1 also splits
+    each recording into segments, so up to jobs * workers processes encode at once.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    output_dir = output_dir or input_dir
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = BatchManifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+    settings = {'quality': quality, 'backend': backend, 'width': OUTPUT_WIDTH, 'height': OUTPUT_HEIGHT}
+
+    last_seen = {}
+    # Signature each file was submitted with, so a replaced recording is picked up again
+    submitted = {}
+    running = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        try:
+            while True:
+                for input_file in find_recordings(input_dir):
+                    try:
+                        stat = os.stat(input_file)
+                    except FileNotFoundError:
+                        continue
+                    signature = (stat.st_size, stat.st_mtime)
+                    if submitted.get(input_file) == signature:
+                        continue
+                    if watch and last_seen.get(input_file) != signature:
+                        # Possibly still being recorded; check again next poll
+                        last_seen[input_file] = signature
+                        continue
+
+                    submitted[input_file] = signature
+                    key = manifest.key(input_file, settings)
+                    if manifest.is_done(key):
+                        print(f"Skipping {input_file} (already processed)")
+                        continue
+
+                    output_file = batch_output_path(input_file, output_dir)
+                    manifest.update(key, input_file=input_file, output_file=output_file,
+                                    settings=settings, status="running", started=time.time())
+                    job = {'input_file': input_file, 'output_file': output_file,
+                           'quality': quality, 'backend': backend, 'workers': workers}
+                    running[executor.submit(batch_job, job)] = (key, input_file)
+
+                # Record results as they finish
+                finished = [future for future in running if future.done()]
+                for future in finished:
+                    key, input_file = running.pop(future)
+                    try:
+                        future.result()
+                        manifest.update(key, status="done", finished=time.time())
+                    except Exception as e:
+                        print(f"Error processing {input_file}: {e}")
+                        manifest.update(key, status="failed", error=str(e), finished=time.time())
+                        # Let the next poll retry it
+                        submitted.pop(input_file, None)
+
+                if not watch and not running:
+                    break
+                time.sleep(poll_interval if watch else 0.5)
+        except KeyboardInterrupt:
+            print("\nStopping batch; unfinished recordings will be redone on the next run.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+def main():
+    parser = argparse.ArgumentParser(description='Crop videos to 9:16 for social media')
+    parser.add_argument('input_file', nargs='?', default="raw_footage/2025-04-22 13-17-18.mov",
+                        help='Video to process')
+    parser.add_argument('output_file', nargs='?', default=None,
+                        help='Where to write the result (default: <input>_social_media<ext>)')
+    parser.add_argument('--quality', choices=['lanczos', 'fast'], default='lanczos',
+                        help='Resize filter: lanczos (default) or faster nearest-neighbour')
+    parser.add_argument('--backend', choices=['moviepy', 'ffmpeg'], default='moviepy',
+                        help='moviepy (default) or a single-pass native ffmpeg filter chain')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Encode keyframe-aligned segments in this many parallel processes')
+    parser.add_argument('--batch', type=str, metavar='DIR',
+                        help='Process every recording in DIR, skipping ones already done')
+    parser.add_argument('--watch', action='store_true',
+                        help='With --batch, keep watching DIR for new recordings')
+    parser.add_argument('--output-dir', type=str, help='Where batch outputs and extracted clips go (default: next to the input)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Recordings processed in parallel in batch mode (default: CPU count)')
+    parser.add_argument('--ranges', type=str,
+                        help='Only render these time ranges, e.g. "1:00-2:30,1:02:10-1:03:00", one output each')
+    parser.add_argument('--ranges-file', type=str,
+                        help='File with one start-end time range per line (same format as --ranges)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare resize throughput against the PIL path and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_resize()
+        return
+
+    if args.batch:
+        process_batch(args.batch, args.output_dir, args.quality, args.backend, args.jobs, args.watch,
+                      workers=args.workers)
+        return
+
+    if args.ranges or args.ranges_file:
+        spec = args.ranges or ""
+        if args.ranges_file:
+            with open(args.ranges_file) as f:
+                spec += "\n" + f.read()
+        extract_clips(args.input_file, parse_ranges(spec), args.output_dir, args.quality, args.backend)
+        return
+
+    output_file = args.output_file
+    if output_file is None and args.input_file == "raw_footage/2025-04-22 13-17-18.mov":
+        output_file = "raw_footage/2025-04-22_social_media.mp4"
+    crop_for_social_media(args.input_file, output_file, args.quality, args.backend, args.workers)
 
 if __name__ == "__main__":
-    input_file = "raw_footage/2025-04-22 13-17-18.mov"
-    output_file = "raw_footage/2025-04-22_social_media.mp4"
-    crop_for_social_media(input_file, output_file) 
\ No newline at end of file
+    main() 
\ No newline at end of file
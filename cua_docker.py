@@ -36,6 +36,10 @@ class CuaDocker:
         except subprocess.CalledProcessError:
             return False
 
+    def attach(self) -> bool:
+        """Attach to the container if it is already running, without starting one."""
+        return self._check_container_exists()
+
     def build_image(self) -> None:
         """Build the Docker image."""
         print("Building Docker image...")
@@ -2,11 +2,13 @@ import os
 import imaplib
 import smtplib
 import email
+import re
+import sqlite3
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import decode_header
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
-import openai
 import argparse
 
 # Load environment variables
@@ -27,8 +29,9 @@ class EmailClient:
         self.smtp_user = os.getenv('SMTP_USER')
         self.smtp_password = os.getenv('SMTP_PASSWORD')
 
-        # OpenAI Configuration
-        openai.api_key = os.getenv('OPENAI_API_KEY')
+        # Local search index
+        self.index_path = os.getenv('EMAIL_INDEX_PATH', 'email_index.db')
+        self.index = None
 
         # Initialize connections
         self.imap = None
@@ -60,12 +63,19 @@ class EmailClient:
             print(f"SMTP Connection Error: {str(e)}")
             return False
 
+    def decode_bytes(self, data, charset=None):
+        """Decode header or body bytes, falling back to UTF-8 for unknown charsets like unknown-8bit"""
+        try:
+            return data.decode(charset or 'utf-8', errors='replace')
+        except LookupError:
+            return data.decode('utf-8', errors='replace')
+
     def decode_subject(self, subject):
         """Decode email subject"""
         decoded = []
         for part, encoding in decode_header(subject):
             if isinstance(part, bytes):
-                decoded.append(part.decode(encoding or 'utf-8'))
+                decoded.append(self.decode_bytes(part, encoding))
             else:
                 decoded.append(part)
         return ''.join(decoded)
@@ -123,8 +133,9 @@ class EmailClient:
         ])
 
         try:
-            client = openai.OpenAI()
-            response = client.chat.completions.create(
+            from openai_gateway import get_gateway
+            response = get_gateway().call(
+                "chat.completions.create",
                 model="gpt-4.1-mini",
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that summarizes emails concisely."},
@@ -199,6 +210,9 @@ class EmailClient:
                 self.smtp.quit()
             except:
                 pass
+        if self.index:
+            self.index.close()
+            self.index = None
 
     def display_unread_emails(self, emails):
         """Display crucial information about unread emails"""
@@ -300,6 +314,142 @@ class EmailClient:
             print(f"Error fetching recent email: {str(e)}")
             return None
 
+    def open_index(self):
+        """Open (and create if needed) the local full-text search index"""
+        if self.index:
+            return self.index
+
+        self.index = sqlite3.connect(self.index_path)
+        self.index.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+                from_addr, subject, date, body,
+                uid UNINDEXED, message_id UNINDEXED, timestamp UNINDEXED,
+                tokenize = 'porter unicode61'
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                mailbox TEXT PRIMARY KEY,
+                uidvalidity INTEGER,
+                last_uid INTEGER
+            );
+        """)
+        return self.index
+
+    def get_text_content(self, email_message):
+        """Extract the plain-text body of a message, tolerating bad encodings"""
+        if email_message.is_multipart():
+            for part in email_message.walk():
+                if part.get_content_type() == "text/plain":
+                    payload = part.get_payload(decode=True) or b""
+                    return self.decode_bytes(payload, part.get_content_charset())
+            return ""
+        payload = email_message.get_payload(decode=True) or b""
+        return self.decode_bytes(payload, email_message.get_content_charset())
+
+    def sync_index(self, mailbox='INBOX', batch_size=100):
+        """Add messages that arrived since the last sync to the local index"""
+        if not self.imap:
+            if not self.connect_imap():
+                return 0
+
+        index = self.open_index()
+        try:
+            _, data = self.imap.status(mailbox, '(UIDVALIDITY)')
+            uidvalidity = int(re.search(rb'UIDVALIDITY (\d+)', data[0]).group(1))
+
+            row = index.execute(
+                "SELECT uidvalidity, last_uid FROM sync_state WHERE mailbox = ?", (mailbox,)
+            ).fetchone()
+            last_uid = 0
+            if row and row[0] == uidvalidity:
+                last_uid = row[1]
+            elif row:
+                # UIDs were reassigned by the server, so the old index is stale
+                index.execute("DELETE FROM messages")
+                index.execute(
+                    "INSERT OR REPLACE INTO sync_state (mailbox, uidvalidity, last_uid) VALUES (?, ?, 0)",
+                    (mailbox, uidvalidity)
+                )
+                index.commit()
+
+            _, messages = self.imap.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+            # "N:*" always matches the highest UID, even when it is <= last_uid
+            new_uids = [uid for uid in messages[0].split() if int(uid) > last_uid]
+
+            for start in range(0, len(new_uids), batch_size):
+                batch = new_uids[start:start + batch_size]
+                _, msg_data = self.imap.uid('FETCH', b','.join(batch), '(UID BODY.PEEK[])')
+                for item in msg_data:
+                    if not isinstance(item, tuple):
+                        continue
+                    uid = int(re.search(rb'UID (\d+)', item[0]).group(1))
+                    try:
+                        self.index_message(uid, email.message_from_bytes(item[1]))
+                    except Exception as e:
+                        # Skip it rather than fail the batch, or every later sync would stop here
+                        print(f"Skipping message UID {uid} that could not be indexed: {str(e)}")
+                    last_uid = max(last_uid, uid)
+
+                # Commit per batch so an interrupted sync resumes where it stopped
+                index.execute(
+                    "INSERT OR REPLACE INTO sync_state (mailbox, uidvalidity, last_uid) VALUES (?, ?, ?)",
+                    (mailbox, uidvalidity, last_uid)
+                )
+                index.commit()
+
+            return len(new_uids)
+        except Exception as e:
+            print(f"Error syncing search index: {str(e)}")
+            return 0
+
+    def index_message(self, uid, email_message):
+        """Insert a single parsed message into the local index"""
+        date = email_message['date'] or ''
+        try:
+            timestamp = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            timestamp = None
+
+        self.open_index().execute(
+            "INSERT INTO messages (from_addr, subject, date, body, uid, message_id, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                email_message['from'] or '',
+                self.decode_subject(email_message['subject'] or ''),
+                date,
+                self.get_text_content(email_message),
+                uid,
+                email_message['Message-ID'],
+                timestamp,
+            )
+        )
+
+    def search_index(self, query, limit=10):
+        """Search the local index without contacting the server, best matches first"""
+        index = self.open_index()
+        sql = (
+            "SELECT uid, from_addr, subject, date, message_id, "
+            "snippet(messages, 3, '[', ']', '...', 16) "
+            "FROM messages WHERE messages MATCH ? ORDER BY rank LIMIT ?"
+        )
+        try:
+            rows = index.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS5 syntax (e.g. a bare email address), so match the words literally
+            terms = ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+            rows = index.execute(sql, (terms, limit)).fetchall()
+
+        return [
+            {
+                'uid': str(uid),
+                'from': from_addr,
+                'subject': subject,
+                'date': date,
+                'message_id': message_id,
+                'snippet': snippet
+            }
+            for uid, from_addr, subject, date, message_id, snippet in rows
+        ]
+
 def main():
     parser = argparse.ArgumentParser(description='Email Client for Summarization and Response')
     parser.add_argument('--summarize', action='store_true', help='Summarize all unread emails')
@@ -310,6 +460,9 @@ def main():
     parser.add_argument('--recipient', type=str, help='Recipient email address (required for --send)')
     parser.add_argument('--subject', type=str, help='Email subject (required for --send)')
     parser.add_argument('--body', type=str, help='Email body (required for --send or --respond)')
+    parser.add_argument('--sync', action='store_true', help='Add new mail to the local search index')
+    parser.add_argument('--search', type=str, help='Search the local index (run --sync first)')
+    parser.add_argument('--limit', type=int, default=10, help='Maximum number of search results')
     args = parser.parse_args()
 
     client = EmailClient()
@@ -325,6 +478,28 @@ def main():
                 print("Failed to connect to SMTP server to send email.")
             return
 
+        if args.sync:
+            added = client.sync_index()
+            print(f"Indexed {added} new email(s).")
+            if not args.search:
+                return
+
+        if args.search:
+            results = client.search_index(args.search, args.limit)
+            if not results:
+                print("No matching emails found in the local index.")
+                return
+            print(f"\nFound {len(results)} matching email(s):")
+            print("-" * 50)
+            for idx, result in enumerate(results, 1):
+                print(f"\nResult {idx}:")
+                print(f"From: {result['from']}")
+                print(f"Subject: {result['subject']}")
+                print(f"Date: {result['date']}")
+                print(f"Match: {result['snippet']}")
+                print("-" * 50)
+            return
+
         if args.recent:
             recent_email = client.get_recent_email()
             if recent_email:
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+# Command-line entry points of the command-center tools
+ENTRY_POINTS = [
+    'email_client',
+    'ai_voice',
+    'crop_video',
+    'computer_control',
+    'instagram_cua',
+    'cua_docker',
+    'command_center',
+]
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure_imports(module):
+    """Import `module` in a fresh interpreter under -X importtime. Returns (per-module timings, error)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    timings = []
+    other = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append({
+                'name': name,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': len(indent) // 2,
+            })
+        elif not line.startswith('import time:'):
+            other.append(line)
+    error = other[-1] if result.returncode != 0 and other else None
+    return timings, error
+
+
+def best_wall_ms(command, runs):
+    """Best wall-clock time of running `command` over `runs` runs, in milliseconds."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, capture_output=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(module, runs, top):
+    timings, error = measure_imports(module)
+    print(f"\n{module}")
+    if error:
+        print(f"  import failed: {error}")
+        return
+    position = max(i for i, t in enumerate(timings) if t['name'] == module)
+    own = timings[position]
+    print(f"  import:  {own['cumulative_ms']:.1f} ms (-X importtime cumulative)")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{module}.py')
+    print(f"  --help:  {best_wall_ms([sys.executable, script, '--help'], runs):.1f} ms wall, best of {runs}")
+    # importtime prints children before their parent, so the module's direct
+    # imports are the deeper entries right above it
+    direct = []
+    for t in reversed(timings[:position]):
+        if t['depth'] <= own['depth']:
+            break
+        if t['depth'] == own['depth'] + 1:
+            direct.append(t)
+    for t in sorted(direct, key=lambda t: t['cumulative_ms'], reverse=True)[:top]:
+        print(f"    {t['cumulative_ms']:8.1f} ms  {t['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import and CLI startup time of the command-center tools')
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS, help='Modules to measure (default: all entry points)')
+    parser.add_argument('--runs', type=int, default=5, help='Startup runs per module; the best is reported')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest direct imports to list per module')
+    args = parser.parse_args()
+
+    baseline = best_wall_ms([sys.executable, '-c', 'pass'], args.runs)
+    print(f"Python {sys.version.split()[0]}, bare interpreter startup: {baseline:.1f} ms")
+    for module in args.modules:
+        report(module, args.runs, args.top)
+
+
+if __name__ == '__main__':
+    main()
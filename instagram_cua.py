@@ -3,7 +3,6 @@ import argparse
 import logging
 from typing import Optional
 from cua_docker import CuaDocker
-from computer_control import ComputerControl
 
 # Configure logging
 logging.basicConfig(
@@ -17,41 +16,61 @@ class InstagramCUA:
         self.docker = None
         self.computer_control = None
 
-    def run_with_instruction(self, instruction: str, use_hardcoded: bool = True) -> None:
-        """Run the CUA agent with the given instruction."""
+    def run_with_instruction(self, instruction: Optional[str], use_hardcoded: bool = True,
+                             input_backend: str = "xdotool", checkpoint_path: Optional[str] = None,
+                             resume: bool = False) -> None:
+        """Run the CUA agent with the given instruction, or resume the checkpointed task."""
         try:
-            logger.info("Initializing Docker container...")
-            self.docker = CuaDocker()
-            self.docker.build_image()
-            self.docker.start_container()
+            from computer_control import ComputerControl
+            if not resume:
+                logger.info("Initializing Docker container...")
+                self.docker = CuaDocker()
+                self.docker.build_image()
+                self.docker.start_container()
             
             logger.info("Initializing ComputerControl...")
-            self.computer_control = ComputerControl()
+            self.computer_control = ComputerControl(input_backend=input_backend)
             
-            if use_hardcoded:
+            if use_hardcoded and not resume:
                 logger.info("Executing hardcoded sequence...")
                 self.computer_control.execute_hardcoded_sequence()
             
             logger.info("Starting CUA loop with instruction...")
-            self.computer_control.run_cua_loop(instruction)
+            self.computer_control.run_cua_loop(instruction, checkpoint_path=checkpoint_path, resume=resume)
             
         except Exception as e:
             logger.error(f"Error during execution: {str(e)}")
             raise
         finally:
-            if self.docker:
+            if self.computer_control and self.computer_control.checkpoint_pending:
+                logger.info("Leaving Docker container running for --resume")
+            elif self.docker:
                 logger.info("Cleaning up Docker container...")
                 self.docker.stop_container()
 
 def main():
     parser = argparse.ArgumentParser(description="Run CUA agent")
-    parser.add_argument("--instruction", required=True, help="The instruction for the CUA agent to execute")
+    parser.add_argument("--instruction", help="The instruction for the CUA agent to execute")
     parser.add_argument("--no-hardcoded", action="store_true", help="Skip hardcoded sequence and use CUA directly")
+    parser.add_argument("--input-backend", default=os.getenv("CUA_INPUT_BACKEND", "xdotool"), choices=["xdotool", "vnc"],
+                        help="Send input and capture screenshots via xdotool in the container or over VNC")
+    parser.add_argument("--checkpoint", default=os.getenv("CUA_CHECKPOINT", "cua_checkpoint.json"),
+                        help="File the loop state is saved to after every step")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="Don't save checkpoints; the container is stopped even if the task fails")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the checkpointed task in its still running container")
     
     args = parser.parse_args()
+    if args.resume and args.no_checkpoint:
+        parser.error("--resume needs a checkpoint")
+    if not args.instruction and not args.resume:
+        parser.error("--instruction is required unless resuming")
     
     instagram_cua = InstagramCUA()
-    instagram_cua.run_with_instruction(args.instruction, not args.no_hardcoded)
+    instagram_cua.run_with_instruction(args.instruction, not args.no_hardcoded, args.input_backend,
+                                       checkpoint_path=None if args.no_checkpoint else args.checkpoint,
+                                       resume=args.resume)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+import openai
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# Concurrent requests per model. Quotas depend on the account's usage tier, so
+# requests/tokens-per-minute buckets only apply when configured, e.g.
+# OPENAI_RATE_LIMITS='{"gpt-4.1-mini": {"rpm": 5000, "tpm": 2000000}}'; without
+# them the server's 429s (and their Retry-After) do the pacing.
+DEFAULT_RATE_LIMITS = {
+    "gpt-4.1-mini": {"concurrency": 8},
+    "computer-use-preview": {"concurrency": 2},
+    "tts-1": {"concurrency": 6},
+    "tts-1-hd": {"concurrency": 6},
+}
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT", "120"))
+# Rough token cost of an image input when estimating a request up front
+IMAGE_TOKEN_ESTIMATE = 1000
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """Block until `amount` tokens are available and take them. Returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, amount: float) -> None:
+        """Take (or with a negative amount, return) tokens after the fact; may go into debt."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def pause(self, seconds: float) -> None:
+        """Let no request through for `seconds`, e.g. after the server answered 429."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class ModelLimiter:
+    """Request, token and concurrency limits for one model."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 concurrency: Optional[int] = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+
+    @contextmanager
+    def reserve(self, estimated_tokens: int):
+        """Wait for rate and concurrency budget, then hold a slot while the request runs."""
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and estimated_tokens:
+            self.tokens.acquire(estimated_tokens)
+        if self.slots:
+            self.slots.acquire()
+        try:
+            yield
+        finally:
+            if self.slots:
+                self.slots.release()
+
+
+class OpenAIGateway:
+    """
+    One shared OpenAI client for every tool in the process.
+
+    Calls go through per-model concurrency slots and any configured token-bucket
+    rate limits, are retried with exponential backoff and full jitter on 429s,
+    timeouts, connection errors and 5xx responses, and identical concurrent requests are
+    coalesced into one. Per-model latency, retry and token counters are kept
+    in `metrics()`.
+    """
+
+    def __init__(self, client: Optional[OpenAI] = None, rate_limits: Optional[Dict[str, Dict]] = None):
+        # Retries are handled here so they can respect the shared rate limits
+        self.client = client or OpenAI(max_retries=0, timeout=REQUEST_TIMEOUT_SECONDS)
+        self.rate_limits = {model: dict(limits) for model, limits in DEFAULT_RATE_LIMITS.items()}
+        for configured in (json.loads(os.getenv("OPENAI_RATE_LIMITS", "{}")), rate_limits or {}):
+            for model, limits in configured.items():
+                self.rate_limits.setdefault(model, {}).update(limits)
+        self.limiters: Dict[str, ModelLimiter] = {}
+        self.in_flight: Dict[str, Future] = {}
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.lock = threading.Lock()
+
+    def _limiter(self, model: Optional[str]) -> Optional[ModelLimiter]:
+        if model is None or model not in self.rate_limits:
+            return None
+        with self.lock:
+            if model not in self.limiters:
+                self.limiters[model] = ModelLimiter(**self.rate_limits[model])
+            return self.limiters[model]
+
+    def _resolve(self, method: str):
+        """Turn a dotted path like "chat.completions.create" into the client method."""
+        target = self.client
+        for name in method.split("."):
+            target = getattr(target, name)
+        return target
+
+    def _record(self, model: Optional[str], **deltas: float) -> None:
+        with self.lock:
+            stats = self.stats.setdefault(model or "unknown", {
+                "calls": 0, "errors": 0, "retries": 0, "deduplicated": 0,
+                "latency_total": 0.0, "latency_max": 0.0, "rate_limit_wait": 0.0,
+                "input_tokens": 0, "output_tokens": 0,
+            })
+            for key, value in deltas.items():
+                if key == "latency_max":
+                    stats[key] = max(stats[key], value)
+                else:
+                    stats[key] += value
+
+    @staticmethod
+    def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+        """Rough token count of a request (about 4 characters per token) for the tpm bucket."""
+        chars = 0
+        images = 0
+
+        def walk(value):
+            nonlocal chars, images
+            if isinstance(value, str):
+                if value.startswith("data:image/"):
+                    images += 1
+                else:
+                    chars += len(value)
+            elif isinstance(value, dict):
+                for item in value.values():
+                    walk(item)
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    walk(item)
+
+        walk(kwargs.get("messages") or kwargs.get("input") or "")
+        output_budget = kwargs.get("max_tokens") or kwargs.get("max_output_tokens") or 0
+        return chars // 4 + images * IMAGE_TOKEN_ESTIMATE + output_budget
+
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """Server-provided Retry-After if present, otherwise exponential backoff with full jitter."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _with_retries(self, model: Optional[str], method: str, send, estimated_tokens: int,
+                      hold: Optional[ExitStack] = None):
+        """Send under the model's limits, retrying transient errors.
+
+        With hold, the concurrency slot of the successful attempt is handed to
+        that ExitStack instead of being released when send() returns.
+        """
+        limiter = self._limiter(model)
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                with ExitStack() as reservation:
+                    if limiter:
+                        reservation.enter_context(limiter.reserve(estimated_tokens))
+                    waited = time.perf_counter() - start
+                    start = time.perf_counter()
+                    result = send()
+                    if hold is not None:
+                        hold.push(reservation.pop_all())
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_RETRIES:
+                    self._record(model, errors=1)
+                    raise
+                delay = self._retry_delay(e, attempt)
+                if limiter and limiter.requests and isinstance(e, openai.RateLimitError):
+                    limiter.requests.pause(delay)
+                self._record(model, retries=1)
+                logger.warning(f"{method} ({model}) failed with {type(e).__name__}, "
+                               f"retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self._record(model, errors=1)
+                raise
+
+            latency = time.perf_counter() - start
+            self._record(model, calls=1, latency_total=latency, latency_max=latency, rate_limit_wait=waited)
+            return result, limiter
+
+    def _record_usage(self, model: Optional[str], limiter: Optional[ModelLimiter], response,
+                      estimated_tokens: int) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        input_tokens = getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", 0) or 0
+        self._record(model, input_tokens=input_tokens, output_tokens=output_tokens)
+        if limiter and limiter.tokens:
+            # Settle the estimate against what was actually used
+            limiter.tokens.adjust(input_tokens + output_tokens - estimated_tokens)
+
+    def call(self, method: str, *, dedupe: bool = True, **kwargs) -> Any:
+        """
+        Call a client method by dotted path, e.g. call("chat.completions.create", model=..., messages=...).
+        With dedupe, an identical request already in flight is awaited instead of sent again.
+        """
+        model = kwargs.get("model")
+        key = None
+        if dedupe:
+            key = hashlib.sha256(json.dumps([method, kwargs], sort_keys=True, default=str).encode()).hexdigest()
+            with self.lock:
+                pending = self.in_flight.get(key)
+                if pending is None:
+                    self.in_flight[key] = Future()
+            if pending is not None:
+                self._record(model, deduplicated=1)
+                return pending.result()
+
+        response = None
+        error = None
+        try:
+            estimated_tokens = self.estimate_tokens(kwargs)
+            response, limiter = self._with_retries(model, method, lambda: self._resolve(method)(**kwargs),
+                                                   estimated_tokens)
+            self._record_usage(model, limiter, response, estimated_tokens)
+            return response
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # Always release waiters, also on KeyboardInterrupt, or identical calls would hang forever
+            if key:
+                with self.lock:
+                    pending = self.in_flight.pop(key)
+                if error is not None:
+                    pending.set_exception(error)
+                else:
+                    pending.set_result(response)
+
+    @contextmanager
+    def stream(self, method: str, **kwargs):
+        """
+        Open a streaming response (e.g. "audio.speech.with_streaming_response.create")
+        under the same limits and retries; retries cover the request up to the response headers.
+        The concurrency slot stays taken until the body has been read.
+        """
+        model = kwargs.get("model")
+
+        def open_stream():
+            manager = self._resolve(method)(**kwargs)
+            return manager, manager.__enter__()
+
+        with ExitStack() as hold:
+            (manager, response), _ = self._with_retries(model, method, open_stream, self.estimate_tokens(kwargs),
+                                                        hold=hold)
+            # Closes the response before the slot is released
+            hold.callback(manager.__exit__, None, None, None)
+            yield response
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-model counters, with average latency in seconds."""
+        with self.lock:
+            snapshot = {model: dict(stats) for model, stats in self.stats.items()}
+        for stats in snapshot.values():
+            stats["latency_avg"] = stats["latency_total"] / stats["calls"] if stats["calls"] else None
+        return snapshot
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> OpenAIGateway:
+    """The process-wide gateway, created on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = OpenAIGateway()
+        return _gateway
+
+
+def gateway_metrics() -> Dict[str, Dict[str, float]]:
+    """Metrics of the process-wide gateway, or nothing if no request was made yet."""
+    with _gateway_lock:
+        gateway = _gateway
+    return gateway.metrics() if gateway else {}
@@ -0,0 +1,383 @@
+import socket
+import struct
+import threading
+import time
+import logging
+from typing import Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# RFB protocol constants (RFC 6143)
+SECURITY_INVALID = 0
+SECURITY_NONE = 1
+SECURITY_VNC_AUTH = 2
+
+ENCODING_RAW = 0
+ENCODING_COPYRECT = 1
+ENCODING_DESKTOP_SIZE = -223
+
+SERVER_FRAMEBUFFER_UPDATE = 0
+SERVER_SET_COLOUR_MAP = 1
+SERVER_BELL = 2
+SERVER_CUT_TEXT = 3
+
+CLIENT_SET_PIXEL_FORMAT = 0
+CLIENT_SET_ENCODINGS = 2
+CLIENT_UPDATE_REQUEST = 3
+CLIENT_KEY_EVENT = 4
+CLIENT_POINTER_EVENT = 5
+
+# 32 bits per pixel, depth 24, little-endian, true colour, red/green/blue at
+# bit shifts 0/8/16: pixels arrive as R, G, B, X bytes, which PIL reads directly
+PIXEL_FORMAT = struct.pack("!BBBBHHHBBB3x", 32, 24, 0, 1, 255, 255, 255, 0, 8, 16)
+BYTES_PER_PIXEL = 4
+
+BUTTON_MASKS = {"left": 1, "middle": 2, "wheel": 2, "right": 4, "back": 128}
+SCROLL_MASKS = {"up": 8, "down": 16, "left": 32, "right": 64}
+# Pixels of scroll offset per wheel notch
+SCROLL_STEP_PIXELS = 100
+
+# X11 keysyms for named keys; single characters map to their own keysym
+KEYSYMS = {
+    "backspace": 0xff08, "tab": 0xff09, "enter": 0xff0d, "return": 0xff0d,
+    "escape": 0xff1b, "esc": 0xff1b, "delete": 0xffff, "del": 0xffff,
+    "home": 0xff50, "left": 0xff51, "arrowleft": 0xff51, "up": 0xff52, "arrowup": 0xff52,
+    "right": 0xff53, "arrowright": 0xff53, "down": 0xff54, "arrowdown": 0xff54,
+    "pageup": 0xff55, "page_up": 0xff55, "pagedown": 0xff56, "page_down": 0xff56,
+    "end": 0xff57, "insert": 0xff63, "space": 0x20,
+    "shift": 0xffe1, "ctrl": 0xffe3, "control": 0xffe3, "alt": 0xffe9, "option": 0xffe9,
+    "meta": 0xffeb, "super": 0xffeb, "cmd": 0xffeb, "win": 0xffeb,
+    **{f"f{n}": 0xffbe + n - 1 for n in range(1, 13)},
+}
+
+
+class VncAuthError(Exception):
+    """The VNC server rejected the connection or the password."""
+
+
+def keysym(key: str) -> int:
+    """X11 keysym for a key name ("Return", "ctrl", "F5") or a single character."""
+    if len(key) == 1:
+        if key == "\n":
+            return KEYSYMS["return"]
+        if key == "\t":
+            return KEYSYMS["tab"]
+        code = ord(key)
+        # Latin-1 characters are their own keysym, the rest of Unicode is offset
+        return code if 0x20 <= code <= 0xff else 0x01000000 | code
+    name = key.lower()
+    if name not in KEYSYMS:
+        raise ValueError(f"Unknown key: {key}")
+    return KEYSYMS[name]
+
+
+def vnc_auth_response(password: str, challenge: bytes) -> bytes:
+    """DES-encrypt the server challenge with the password, as VNC authentication requires."""
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, modes
+        try:
+            from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+        except ImportError:
+            from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+    except ImportError:
+        raise VncAuthError("VNC password authentication needs the 'cryptography' package")
+
+    # VNC uses the password (padded/truncated to 8 bytes) as a DES key with
+    # the bits of every byte reversed; TripleDES with the key repeated three times is single DES
+    key = bytes(int(f"{b:08b}"[::-1], 2) for b in password.encode("latin-1")[:8].ljust(8, b"\0"))
+    encryptor = Cipher(TripleDES(key * 3), modes.ECB()).encryptor()
+    return encryptor.update(challenge) + encryptor.finalize()
+
+
+class VncClient:
+    """
+    Persistent RFB connection used for both input and capture.
+
+    A background thread applies framebuffer updates (Raw and CopyRect
+    rectangles) to a host-side RGBX copy of the screen and keeps one
+    incremental update request outstanding, so a screenshot is a memory copy.
+    Each input action is sent as a single socket write.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 5900, password: Optional[str] = None,
+                 connect_timeout: float = 15.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.sock = None
+        self.width = 0
+        self.height = 0
+        self.framebuffer = bytearray()
+        self.name = ""
+        self.pointer_position = (0, 0)
+        self.serial = 0
+        self.last_update = 0.0
+        self.error = None
+        self.closing = False
+        self.reader = None
+        self.send_lock = threading.Lock()
+        self.updated = threading.Condition()
+
+    @property
+    def alive(self) -> bool:
+        return self.sock is not None and self.reader is not None and self.reader.is_alive() and not self.error
+
+    def connect(self) -> None:
+        """Connect and handshake, retrying while the server is still starting, then wait for the first frame."""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=5)
+                self._handshake()
+                break
+            except OSError as e:
+                # Docker accepts on the published port before x11vnc listens and then drops the connection
+                self._close_socket()
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"Could not connect to VNC server at {self.host}:{self.port}: {e}")
+                time.sleep(0.5)
+
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send(
+            struct.pack("!B3x", CLIENT_SET_PIXEL_FORMAT) + PIXEL_FORMAT,
+            struct.pack("!BxH3i", CLIENT_SET_ENCODINGS, 3, ENCODING_COPYRECT, ENCODING_RAW, ENCODING_DESKTOP_SIZE),
+            self._update_request(incremental=False),
+        )
+        self.reader = threading.Thread(target=self._read_loop, name="vnc-reader", daemon=True)
+        self.reader.start()
+        with self.updated:
+            if not self.updated.wait_for(lambda: self.serial > 0 or self.error, timeout=self.connect_timeout):
+                raise ConnectionError("VNC server sent no framebuffer")
+        if self.error:
+            raise ConnectionError(f"VNC connection failed: {self.error}")
+        logger.info(f"Connected to VNC server '{self.name}' at {self.host}:{self.port} ({self.width}x{self.height})")
+
+    def _recv_exact(self, size: int) -> bytes:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                raise ConnectionError("VNC server closed the connection")
+            received += count
+        return bytes(buffer)
+
+    def _recv_reason(self) -> str:
+        (length,) = struct.unpack("!I", self._recv_exact(4))
+        return self._recv_exact(length).decode("utf-8", "replace")
+
+    def _handshake(self) -> None:
+        server_version = self._recv_exact(12)
+        if not server_version.startswith(b"RFB "):
+            raise ConnectionError(f"Not an RFB server: {server_version!r}")
+        minor = min(int(server_version[8:11]), 8)
+        minor = minor if minor in (3, 7, 8) else 3
+        self.sock.sendall(b"RFB 003.%03d\n" % minor)
+
+        if minor == 3:
+            (security,) = struct.unpack("!I", self._recv_exact(4))
+            if security == SECURITY_INVALID:
+                raise VncAuthError(self._recv_reason())
+        else:
+            (count,) = struct.unpack("!B", self._recv_exact(1))
+            if count == 0:
+                raise VncAuthError(self._recv_reason())
+            offered = self._recv_exact(count)
+            if SECURITY_VNC_AUTH in offered and self.password is not None:
+                security = SECURITY_VNC_AUTH
+            elif SECURITY_NONE in offered:
+                security = SECURITY_NONE
+            elif SECURITY_VNC_AUTH in offered:
+                raise VncAuthError("VNC server requires a password")
+            else:
+                raise VncAuthError(f"No supported VNC security type offered: {list(offered)}")
+            self.sock.sendall(struct.pack("!B", security))
+
+        if security == SECURITY_VNC_AUTH:
+            challenge = self._recv_exact(16)
+            self.sock.sendall(vnc_auth_response(self.password or "", challenge))
+        if security == SECURITY_VNC_AUTH or minor == 8:
+            (result,) = struct.unpack("!I", self._recv_exact(4))
+            if result != 0:
+                reason = self._recv_reason() if minor == 8 else "authentication failed"
+                raise VncAuthError(f"VNC authentication failed: {reason}")
+
+        # ClientInit (shared session, so a human viewer can watch), then ServerInit
+        self.sock.sendall(b"\x01")
+        self.width, self.height = struct.unpack("!HH16x", self._recv_exact(20))
+        self.name = self._recv_reason()
+        self.framebuffer = bytearray(self.width * self.height * BYTES_PER_PIXEL)
+
+    def _update_request(self, incremental: bool = True) -> bytes:
+        return struct.pack("!BBHHHH", CLIENT_UPDATE_REQUEST, int(incremental), 0, 0, self.width, self.height)
+
+    def _send(self, *messages: bytes) -> None:
+        with self.send_lock:
+            self.sock.sendall(b"".join(messages))
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                (message_type,) = struct.unpack("!B", self._recv_exact(1))
+                if message_type == SERVER_FRAMEBUFFER_UPDATE:
+                    self._read_framebuffer_update()
+                    # Keep one incremental request outstanding so dirty rectangles keep coming
+                    self._send(self._update_request())
+                elif message_type == SERVER_SET_COLOUR_MAP:
+                    _, count = struct.unpack("!xHH", self._recv_exact(5))
+                    self._recv_exact(count * 6)
+                elif message_type == SERVER_BELL:
+                    pass
+                elif message_type == SERVER_CUT_TEXT:
+                    (length,) = struct.unpack("!3xI", self._recv_exact(7))
+                    self._recv_exact(length)
+                else:
+                    raise ConnectionError(f"Unexpected VNC message type {message_type}")
+        except (OSError, struct.error) as e:
+            if not self.closing:
+                logger.error(f"VNC connection lost: {e}")
+            with self.updated:
+                self.error = str(e)
+                self.updated.notify_all()
+
+    def _read_framebuffer_update(self) -> None:
+        (count,) = struct.unpack("!xH", self._recv_exact(3))
+        for _ in range(count):
+            x, y, w, h, encoding = struct.unpack("!HHHHi", self._recv_exact(12))
+            if encoding == ENCODING_RAW:
+                pixels = self._recv_exact(w * h * BYTES_PER_PIXEL)
+                with self.updated:
+                    self._blit(x, y, w, h, pixels)
+            elif encoding == ENCODING_COPYRECT:
+                src_x, src_y = struct.unpack("!HH", self._recv_exact(4))
+                with self.updated:
+                    # Read the source out first; it may overlap the destination
+                    self._blit(x, y, w, h, self._region(src_x, src_y, w, h))
+            elif encoding == ENCODING_DESKTOP_SIZE:
+                with self.updated:
+                    self.width, self.height = w, h
+                    self.framebuffer = bytearray(w * h * BYTES_PER_PIXEL)
+            else:
+                raise ConnectionError(f"Unexpected VNC encoding {encoding}")
+        with self.updated:
+            self.serial += 1
+            self.last_update = time.monotonic()
+            self.updated.notify_all()
+
+    def _blit(self, x: int, y: int, w: int, h: int, pixels: bytes) -> None:
+        stride = self.width * BYTES_PER_PIXEL
+        row_bytes = w * BYTES_PER_PIXEL
+        if x == 0 and w == self.width:
+            start = y * stride
+            self.framebuffer[start:start + h * stride] = pixels
+            return
+        for row in range(h):
+            start = (y + row) * stride + x * BYTES_PER_PIXEL
+            self.framebuffer[start:start + row_bytes] = pixels[row * row_bytes:(row + 1) * row_bytes]
+
+    def _region(self, x: int, y: int, w: int, h: int) -> bytes:
+        stride = self.width * BYTES_PER_PIXEL
+        row_bytes = w * BYTES_PER_PIXEL
+        starts = ((y + row) * stride + x * BYTES_PER_PIXEL for row in range(h))
+        return b"".join(self.framebuffer[start:start + row_bytes] for start in starts)
+
+    def snapshot(self) -> Tuple[int, int, bytes]:
+        """Width, height and a copy of the current RGBX framebuffer."""
+        with self.updated:
+            if self.error:
+                raise ConnectionError(f"VNC connection lost: {self.error}")
+            return self.width, self.height, bytes(self.framebuffer)
+
+    def screenshot(self) -> "Image.Image":
+        """Current screen as an RGB PIL image."""
+        from PIL import Image
+        width, height, pixels = self.snapshot()
+        return Image.frombytes("RGB", (width, height), pixels, "raw", "RGBX")
+
+    def wait_until_idle(self, since: Optional[float] = None, idle: float = 0.3, timeout: float = 1.0) -> None:
+        """
+        Wait until no framebuffer update has arrived for `idle` seconds, counting
+        from `since` (default: now) at the earliest, but never longer than `timeout`.
+        """
+        start = time.monotonic()
+        since = start if since is None else since
+        deadline = start + timeout
+        with self.updated:
+            while True:
+                now = time.monotonic()
+                quiet_for = now - max(self.last_update, since)
+                if quiet_for >= idle or now >= deadline or self.error:
+                    return
+                self.updated.wait(min(idle - quiet_for, deadline - now))
+
+    def _pointer(self, x: int, y: int, mask: int = 0) -> bytes:
+        self.pointer_position = (x, y)
+        return struct.pack("!BBHH", CLIENT_POINTER_EVENT, mask, max(0, x), max(0, y))
+
+    def _key(self, sym: int, down: bool) -> bytes:
+        return struct.pack("!BB2xI", CLIENT_KEY_EVENT, int(down), sym)
+
+    def move(self, x: int, y: int) -> None:
+        self._send(self._pointer(x, y))
+
+    def click(self, x: int, y: int, button: str = "left", count: int = 1) -> None:
+        """Move to (x, y) and press and release a button `count` times."""
+        mask = BUTTON_MASKS.get(button, BUTTON_MASKS["left"])
+        events = [self._pointer(x, y)]
+        for _ in range(count):
+            events += [self._pointer(x, y, mask), self._pointer(x, y)]
+        self._send(*events)
+
+    def drag(self, path: Sequence[Tuple[int, int]], button: str = "left") -> None:
+        """Press at the first point, move through the rest and release at the last."""
+        mask = BUTTON_MASKS.get(button, BUTTON_MASKS["left"])
+        (x, y), rest = path[0], path[1:]
+        events = [self._pointer(x, y), self._pointer(x, y, mask)]
+        for x, y in rest:
+            events.append(self._pointer(x, y, mask))
+        events.append(self._pointer(x, y))
+        self._send(*events)
+
+    def scroll(self, x: int, y: int, scroll_x: int = 0, scroll_y: int = 0) -> None:
+        """Scroll at (x, y) by wheel notches approximating the pixel offsets."""
+        events = [self._pointer(x, y)]
+        for offset, negative, positive in ((scroll_y, "up", "down"), (scroll_x, "left", "right")):
+            if not offset:
+                continue
+            mask = SCROLL_MASKS[positive if offset > 0 else negative]
+            for _ in range(max(1, round(abs(offset) / SCROLL_STEP_PIXELS))):
+                events += [self._pointer(x, y, mask), self._pointer(x, y)]
+        self._send(*events)
+
+    def type_text(self, text: str) -> None:
+        self._send(*(self._key(keysym(c), down) for c in text for down in (True, False)))
+
+    def keypress(self, keys: Sequence[str]) -> None:
+        """Press keys together as a chord (e.g. ["ctrl", "a"]) and release them in reverse order."""
+        syms = [keysym(key.lower() if len(key) == 1 else key) for key in keys]
+        self._send(*[self._key(sym, True) for sym in syms], *[self._key(sym, False) for sym in reversed(syms)])
+
+    def _close_socket(self) -> None:
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def close(self) -> None:
+        self.closing = True
+        if self.sock is not None:
+            try:
+                # Wakes the reader thread, which then exits on the closed connection
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.reader is not None:
+            self.reader.join(timeout=2)
+            self.reader = None
+        self._close_socket()